@@ -0,0 +1,229 @@
+import numpy as np
+
+from collections import defaultdict
+
+STICK = 0
+HIT = 1
+nAction = 2
+
+# probability of every card value, 10 is four times more likely (10, J, Q, K)
+card_prob = {c: (4.0 if c == 10 else 1.0) / 13 for c in range(1, 11)}
+
+# dealer final score index: busted, 17, 18, 19, 20, 21, natural
+DEALER_BUST = 0
+DEALER_NATURAL = 6
+dealer_score = np.array([-1, 17, 18, 19, 20, 21, 21])
+
+_dealer_cache = {}
+
+def dealer_distribution(hard, ace=False, ncard=1):
+    """probability of every dealer final score, dealer doing hit
+    while his score below 17 (same rule as BlackJack.stick)
+
+    hard = int - dealer hard sum (ace counted as 1)
+    ace = bool - True if dealer has an ace
+    ncard = int - number of dealer cards
+
+    return array of 7 probabilities, index is the same as dealer_score
+    """
+    key = (hard, ace, min(ncard, 3))
+    if key in _dealer_cache:
+        return _dealer_cache[key]
+
+    total = hard + 10 if ace and hard + 10 <= 21 else hard
+    dist = np.zeros(len(dealer_score))
+    if total > 21:
+        dist[DEALER_BUST] = 1
+    elif total >= 17:
+        if ncard == 2 and ace and hard == 11:
+            dist[DEALER_NATURAL] = 1
+        else:
+            dist[total - 16] = 1
+    else:
+        for card, prob in card_prob.items():
+            dist += prob * dealer_distribution(hard + card, ace or card == 1,
+                                               ncard + 1)
+
+    _dealer_cache[key] = dist
+    return dist
+
+def next_hand(hard, usable, card):
+    """player hand (hard sum, usable ace) after drawing one card,
+    once an ace is not usable it never become usable again"""
+    hard = hard + card
+    return hard, (usable or card == 1) and hard + 10 <= 21
+
+
+class BlackJackModel(object):
+    """Create the exact dynamics of the BlackJack environment
+
+    The observed state (player score, dealer score, usable ace) is not enough
+    to know the natural condition, so player hand is extended by its kind:
+        'initial' - only one card (the state after reset)
+        'normal'  - two or more cards which are not a natural
+        'natural' - an ace and a ten
+    dealer hand is only his first card because he plays after player sticks.
+
+    states = list - observed state (player score, dealer score, usable ace)
+             of every model state
+    P = array [action, s, s'] - transition probability, busted and finished
+        games go to terminal which is not included, so rows can sum below 1
+    R = array [action, s] - expected reward of taking action on state s
+    mu0 = array [s] - probability of starting the game on state s
+    """
+
+    def __init__(self):
+        hands = [('initial', c, c == 1) for c in range(1, 11)]
+        hands += [('normal', hard, usable) for usable in (False, True)
+                  for hard in range(2, 22) if hard + 10 * usable <= 21]
+        hands += [('natural', 11, True)]
+        dealers = range(1, 11)
+
+        self.hands = hands
+        self.nS = len(hands) * len(dealers)
+        self.index = {}
+        self.states = []
+        for h, (kind, hard, usable) in enumerate(hands):
+            for d in dealers:
+                self.index[(kind, hard, usable, d)] = len(self.states)
+                self.states.append((hard + 10 * usable, 11 if d == 1 else d,
+                                    usable))
+
+        self.P = np.zeros((nAction, self.nS, self.nS))
+        self.R = np.zeros((nAction, self.nS))
+        self.mu0 = np.zeros(self.nS)
+
+        for (kind, hard, usable, d), s in self.index.items():
+            if kind == 'initial':
+                self.mu0[s] = card_prob[hard] * card_prob[d]
+
+            # STICK
+            dist = dealer_distribution(d, d == 1)
+            if kind == 'natural':
+                self.R[STICK, s] = (dist[DEALER_NATURAL] +
+                                    1.5 * (1 - dist[DEALER_NATURAL]))
+            else:
+                self.R[STICK, s] = np.dot(dist, np.sign(
+                                    hard + 10 * usable - dealer_score))
+
+            # HIT
+            for card, prob in card_prob.items():
+                if kind == 'initial' and sorted([hard, card]) == [1, 10]:
+                    s_new = self.index[('natural', 11, True, d)]
+                    self.P[HIT, s, s_new] += prob
+                    continue
+
+                new_hard, new_usable = next_hand(hard, usable, card)
+                if new_hard > 21:
+                    self.R[HIT, s] -= prob
+                else:
+                    s_new = self.index[('normal', new_hard, new_usable, d)]
+                    self.P[HIT, s, s_new] += prob
+
+    def policy_from_function(self, policy):
+        """policy function of the environment, e.g policy_0(pl, de, ace)
+        which return [stick_prob, hit_prob], to array policy [s, action]"""
+        return np.array([policy(*state) for state in self.states], dtype=float)
+
+    def occupancy(self, policy):
+        """expected number of visits of every state when following policy"""
+        P_pi = np.einsum('sa,ast->st', policy, self.P)
+        return np.linalg.solve(np.eye(self.nS) - P_pi.T, self.mu0)
+
+    def value_to_dict(self, V, policy):
+        """array V to dict V keyed by observed state
+
+        some model states share one observed state, the value is averaged
+        using how often each of them is visited under policy, that is what
+        Monte-Carlo estimate of that observed state converges to
+        """
+        visit = self.occupancy(policy)
+        total = defaultdict(float)
+        weight = defaultdict(float)
+        for s, state in enumerate(self.states):
+            if visit[s] > 0:
+                total[state] += visit[s] * V[s]
+                weight[state] += visit[s]
+
+        new_V = defaultdict(float)
+        for state in total:
+            new_V[state] = total[state] / weight[state]
+        return new_V
+
+
+_model = None
+
+def get_model():
+    """BlackJackModel is built only once then shared"""
+    global _model
+    if _model is None:
+        _model = BlackJackModel()
+    return _model
+
+def policy_evaluation(policy, model=None, discount=1.0, theta=1e-10):
+    """policy evaluation from Sutton's Book, every sweep is done at once
+
+    policy = array [s, action] - probability of choosing action on state s
+    """
+    model = get_model() if model is None else model
+    R_pi = np.sum(policy.T * model.R, axis=0)
+    P_pi = np.einsum('sa,ast->st', policy, model.P)
+
+    V = np.zeros(model.nS)
+    while True:
+        new_V = R_pi + discount * P_pi.dot(V)
+        delta = np.max(np.abs(new_V - V))
+        V = new_V
+        if delta < theta:
+            break
+
+    return V
+
+def value_iteration(model=None, discount=1.0, theta=1e-10):
+    """value iteration from Sutton's Book, every sweep is done at once
+
+    return optimal V, Q and greedy policy [s, action]
+    """
+    model = get_model() if model is None else model
+
+    V = np.zeros(model.nS)
+    while True:
+        Q = model.R + discount * model.P.dot(V)
+        new_V = np.max(Q, axis=0)
+        delta = np.max(np.abs(new_V - V))
+        V = new_V
+        if delta < theta:
+            break
+
+    policy = np.eye(nAction)[np.argmax(Q, axis=0)]
+    return V, Q.T, policy
+
+def value_error(V, exact_V):
+    """largest absolute difference between a sampled dict V and exact dict V
+    over the states both of them have"""
+    keys = [key for key in exact_V if key in V]
+    return max(abs(V[key] - exact_V[key]) for key in keys)
+
+
+if __name__ == "__main__":
+    from lib import plotting
+
+    model = get_model()
+
+    # Policy-0 : always "hit" except we got score >= 20
+    policy = model.policy_from_function(
+        lambda pl_score, de_score, use_ace:
+            [1.0, 0.0] if pl_score >= 20 else [0.0, 1.0])
+    V = policy_evaluation(policy, model)
+    print("Expected return of Policy_0: {}".format(np.dot(model.mu0, V)))
+
+    V, Q, policy = value_iteration(model)
+    print("Expected return of optimal policy: {}".format(np.dot(model.mu0, V)))
+
+    # Delete state with player score below 12 to make it same with example
+    new_V = defaultdict(float)
+    for key, data in model.value_to_dict(V, policy).items():
+        if key[0] >= 12:
+            new_V[key] = data
+
+    plotting.plot_value_function(new_V, title="Optimal Value Function")
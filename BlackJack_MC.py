@@ -1,105 +1,16 @@
+import BlackJack_DP
 import numpy as np
+import os
 
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from BlackJack_env import BlackJack
 from lib import plotting
-
-deck = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10]
-
-class BlackJack(object):
-    """Create an environment of a Black Jack Game
-
-    dealer = list - dealer list card in his deck
-    player = list - player list card in his deck
-    done = bool - True if the game is done, and False otherwise
-
-    this class only can be accessed from act(), reset(), state()
-
-    act() = PARAMS : 1 if hit, 0 if stick
-            RETURN : (state), done_status, reward
-
-    reset() = PARAMS : None
-              RETURN : None
-
-    state() = PARAMS : None
-             RETURN : (state)
-
-    (state) is a tuple of player score, dealers score, usable ace condition
-
-    Black Jack Refferences:
-    [1] https://webdocs.cs.ualberta.ca/~sutton/book/ebook/node51.html (Example 5.1)
-    [2] http://www.bicyclecards.com/how-to-play/blackjack/
-    """
-    def __init__(self):
-        self.reset()
-
-    def reset(self):
-        self.dealer = [self.draw()]
-        self.player = [self.draw()]
-        self.done = False
-
-    def natural(self,hand): # check if he got natural/blackjack condition
-        return sorted(hand)==[1,10]
-
-    def draw(self): # get one card
-        return np.random.choice(deck)
-
-    def usable(self, hand): # check if he got usable ace condition
-        return 1 in hand and sum(hand) + 10 <= 21
-
-    def busted(self, hand): # check if he got busted
-        return self.sum_hand(hand) > 21
-
-    def sum_hand(self, hand):
-        if self.usable(hand):
-            return sum(hand) + 10
-        else:
-            return sum(hand)
-
-    def state(self):
-        return self.sum_hand(self.player), self.sum_hand(self.dealer), \
-                    self.usable(self.player)
-
-    def act(self, hit):
-        if not self.done:
-            if hit:
-                self.hit()
-                if self.busted(self.player):
-                    self.done = True
-                    return self.state(), self.done, -1
-                else:
-                    return self.state(), self.done, 0
-            else:
-                return self.stick()
-
-    def hit(self):
-        self.player.append(self.draw())
-
-    def stick(self):
-        self.done = True
-
-        # Dealer doing hit while his score below 17
-        # see refference [2]
-        while self.sum_hand(self.dealer) < 17:
-            self.dealer.append(self.draw())
-
-        # player'll never get busted in here so just sum it
-        player_score = self.sum_hand(self.player)
-
-        dealer_score = -1 if self.busted(self.dealer) else self.sum_hand(self.dealer)
-
-        if self.natural(self.player) and self.natural(self.dealer):
-            reward = 1
-        elif self.natural(self.player):
-            reward = 1.5
-        elif dealer_score > player_score:
-            reward = -1
-        elif dealer_score < player_score:
-            reward = 1
-        else:
-            reward = 0
-
-        return self.state(), self.done, reward
-
+from lib.policy import EpsilonGreedyPolicy, ProbabilitySampler
+from lib.replay import backward_levels
+from lib.seeding import spawn
+from lib.stats import WelfordStats
+from lib.tabular import TabularValueStore
 
 env = BlackJack()
 
@@ -110,40 +21,104 @@ def policy_0(pl_score, de_score, use_ace):
     # Using probability instead of actual act number for consistency
     return np.array([1.0, 0.0]) if pl_score >= 20 else np.array([0.0, 1.0])
 
-def policy_epsilon(Q, epsilon, state):
+def policy_epsilon(Q, sampler, state):
     """Policy-epsilon :
 	   - always hit when player score < 12
-	   - otherwise:
+	   - otherwise sampler (lib.policy.EpsilonGreedyPolicy) choose:
 		   - epsilon probability choosing random action
 		   - 1-epsilon probability choosing action wich has maximum Q value
     """
 
     # Greedy choose hit when score < 12
     if state[0] < 12:
-        return [0.0, 1.0]
+        return 1
 
-    if np.random.rand() <= epsilon:
-        # Explore
-        return np.array([0.5, 0.5])
-    else:
-        # Exploit
-        best_action = np.argmax(Q[state])
-        A = np.zeros(2)
-        A[best_action] = 1
-        return A
+    return sampler.sample(Q[state])
 
-def mc_prediction(policy, n_episodes, alfa=0.05, discount=1.0, env=env):
-
-    # Make a dictionary with deafult value 0.0
-    V = defaultdict(float)
-    rewardsum = defaultdict(float)
-    counter = defaultdict(float)
-
-    for e in xrange(n_episodes):
-
-        # An episode is a list of tuple:
-        #    (state, reward_after_following_policy)
-        episode = []
+def discounted_returns(rewards, discount=1.0):
+    """return G of every step of an episode in one backward pass,
+    G[t] = rewards[t] + discount * G[t+1]
+    """
+    G = np.zeros(len(rewards))
+    g = 0.0
+    for t in range(len(rewards) - 1, -1, -1):
+        g = rewards[t] + discount * g
+        G[t] = g
+    return G
+
+def visit_steps(keys, first_visit=True):
+    """steps of an episode used for update, First-Visit only uses the first
+    step on every key, Every-Visit uses all steps"""
+    if not first_visit:
+        return range(len(keys))
+
+    seen = set()
+    steps = []
+    for t, key in enumerate(keys):
+        if key not in seen:
+            seen.add(key)
+            steps.append(t)
+    return steps
+
+def mc_prediction(policy, n_episodes, alfa=0.05, discount=1.0, env=env,
+                  first_visit=True, stationary=True, seed=None, recorder=None,
+                  backend='auto'):
+    """Monte-carlo prediction
+
+    first_visit = bool - First-Visit if True, Every-Visit otherwise
+    stationary = bool - True to average all returns (for stationary problem),
+                 False to use constant step alfa (for non-stationary problem)
+    seed = int, SeedSequence or Generator - seed of action choosing
+    recorder = lib.replay.EpisodeRecorder - every step is recorded if given
+    backend = str - 'auto', 'jit' or 'python' (lib.jit.backends), the
+              kernel only runs stationary without a recorder, it gives the
+              same V as the Python learner
+    """
+    if backend != 'python':
+        from lib import jit
+        if jit.use_kernel(backend, stationary and recorder is None):
+            return jit.blackjack_mc_prediction(env, policy, n_episodes,
+                                               discount, seed)
+
+    return _mc_prediction(policy, n_episodes, alfa, discount, env,
+                          first_visit, stationary, seed,
+                          recorder=recorder)[0]
+
+def mc_prediction_ci(policy, target_halfwidth, max_episodes=1000000,
+                     level=0.95, min_visits=30, check_every=1000,
+                     discount=1.0, env=env, first_visit=True, seed=None):
+    """Monte-carlo prediction which stops when it is accurate enough
+
+    Every check_every episodes the confidence interval of every visited
+    state is checked, it stops when all of them have at least min_visits
+    returns and a half width below target_halfwidth (or after max_episodes).
+
+    RETURN : V, stats (lib.stats.WelfordStats, index by env.encoder()),
+             number of episodes run
+    """
+    return _mc_prediction(policy, max_episodes, 0.0, discount, env,
+                          first_visit, True, seed, target_halfwidth, level,
+                          min_visits, check_every)
+
+def _mc_prediction(policy, n_episodes, alfa, discount, env, first_visit,
+                   stationary, seed, target_halfwidth=None, level=0.95,
+                   min_visits=30, check_every=1000, recorder=None):
+    """mc_prediction which also return the return statistics of every state
+    and the number of episodes run"""
+
+    # Make a value table with deafult value 0.0
+    encoder = env.encoder()
+    V = TabularValueStore(encoder)
+    table = V.table
+    stats = WelfordStats(encoder.n_states)
+    sampler = ProbabilitySampler(seed)
+
+    for e in range(n_episodes):
+
+        # An episode is a list of states and a list of
+        # reward_after_following_policy
+        states = []
+        rewards = []
         env.reset()
         now_state = env.state()
         terminate = False
@@ -151,14 +126,16 @@ def mc_prediction(policy, n_episodes, alfa=0.05, discount=1.0, env=env):
         # Generate one episode
         while not terminate:
             # Chosen action
-            action = np.random.choice(np.arange(len(act_prob)), p=act_prob)
-            act_prob = policy(*now_state)
+            action = sampler.sample(policy(*now_state))
 
             # Take action
             next_state, done, reward = env.act(action)
 
             # Save this state
-            episode.append((now_state, reward))
+            states.append(now_state)
+            rewards.append(reward)
+            if recorder is not None:
+                recorder.record(encoder.index[now_state], action, reward, done)
 
             # Move to the next state
             now_state = next_state
@@ -166,162 +143,465 @@ def mc_prediction(policy, n_episodes, alfa=0.05, discount=1.0, env=env):
             if done:
                 terminate = True
 
+        G = discounted_returns(rewards, discount)
 
-        # Uncomment block below for
-        # Monte-carlo First-Visit updates for non-stationary problem
-#        for i, data in enumerate(episode):
-#            state = data[0]
-#            G = sum(data[1]*(discount**ix) for ix,data in enumerate(episode[i:]))
-#
-#            # Incremental average
-#            V[state] = V[state] + alfa*(G - V[state])
+        for t in visit_steps(states, first_visit):
+            state = states[t]
+            i = encoder.index[state]
+            stats.update(i, G[t])
 
-        # Uncomment block below for
-        # Monte-carlo First-Visit updates for stationary problem
-        for i, data in enumerate(episode):
-            state = data[0]
-
-            # data[1] is an actual reward
-            G = sum(data[1]*(discount**ix) for ix, data in enumerate(episode[i:]))
-
-            # in Black Jack in one episode, you'll only see a state once
-            # so you don't need to find another same state
-            counter[state] += 1
-            rewardsum[state] += G
-
-            # average (this is a sutton's book style)
-            V[state] = rewardsum[state] / counter[state]
-            # below is David silver's style using incremental average
-#            V[state] = V[state] + (1.0/counter[state])*(G - V[state])
+            V.visited[i] = True
+            if stationary:
+                # average of all returns (running mean)
+                table[i] = stats.mean[i]
+            else:
+                # Incremental average
+                table[i] += alfa * (G[t] - table[i])
+
+        # Early stopping, only states which have been visited are checked
+        if target_halfwidth is not None and (e + 1) % check_every == 0 and \
+                stats.converged(V.visited, target_halfwidth, level, min_visits):
+            return V, stats, e + 1
+
+    return V, stats, n_episodes
+
+def _mc_prediction_worker(policy, n_episodes, discount, first_visit, seed):
+    """run mc_prediction on its own environment and random streams,
+    return the local return statistics"""
+    env_seed, policy_seed = spawn(seed, 2)
+    worker_env = BlackJack(seed=env_seed)
+    return _mc_prediction(policy, n_episodes, 0.0, discount, worker_env,
+                          first_visit, True, policy_seed)[1]
+
+def mc_prediction_parallel(policy, n_episodes, discount=1.0, first_visit=True,
+                           n_workers=None, seed=None):
+    """Monte-carlo prediction with episodes shared by n_workers processes
+
+    Every worker has independent random streams spawned from seed
+    (lib.seeding.spawn) and keeps its own return statistics, they are merged
+    together at the end. The result is the same for the same seed and
+    n_workers. policy must be a module level function (it is pickled).
+    """
+    n_workers = n_workers or os.cpu_count()
+    seeds = spawn(seed, n_workers)
+    shards = [n_episodes // n_workers + (i < n_episodes % n_workers)
+              for i in range(n_workers)]
+
+    with ProcessPoolExecutor(n_workers) as executor:
+        results = list(executor.map(_mc_prediction_worker,
+                                    [policy] * n_workers, shards,
+                                    [discount] * n_workers,
+                                    [first_visit] * n_workers, seeds))
+
+    V = TabularValueStore(env.encoder())
+    stats = results[0]
+    for worker_stats in results[1:]:
+        stats.merge(worker_stats)
+
+    # average of all returns of all workers
+    V.visited = stats.count > 0
+    V.table[V.visited] = stats.mean[V.visited]
 
     return V
 
-def mc_control(policy, n_episodes, epsilon=0.1, discount=1.0, env=env):
-
-    # Make a dictionary with deafult value 0.0
-    Q = defaultdict(lambda: [0.0, 0.0])
-
-    rewardsum = defaultdict(float)
-    counter = defaultdict(float)
-
-    for e in xrange(n_episodes):
-
-        # An episode is a list of tuple:
-        #   (state, action_based_on_policy, reward_after_following_action)
+def glie_schedule(epsilon=1.0, half_life=1000):
+    """GLIE epsilon schedule, epsilon / (1 + e / half_life) on episode e,
+    it goes to 0 but every action is still tried infinitely often"""
+    return lambda e: epsilon * half_life / (half_life + e)
+
+def exploring_start(env, rng):
+    """reset env to a random state with player score 12-21 and return
+    a random first action (Sutton's book Example 5.3)"""
+    env.reset_to(int(rng.integers(12, 22)), int(rng.integers(1, 11)),
+                 bool(rng.integers(2)))
+    return int(rng.integers(2))
+
+def mc_control(policy, n_episodes, epsilon=0.1, discount=1.0, env=env,
+               first_visit=True, exploring_starts=False,
+               epsilon_schedule=None, seed=None, recorder=None):
+    """Monte-carlo control, Q[state][action] is the average of the returns
+    after taking action on state
+
+    exploring_starts = bool - start every episode from a random state and
+                       action (use epsilon=0 for Sutton's Monte-Carlo ES)
+    epsilon_schedule = function - epsilon of episode e, e.g glie_schedule()
+    seed = int, SeedSequence or Generator - seed of action choosing and
+           exploring starts
+    recorder = lib.replay.EpisodeRecorder - every step is recorded if given
+    """
+    return _mc_control(policy, n_episodes, epsilon, discount, env,
+                       first_visit, exploring_starts, epsilon_schedule,
+                       seed, recorder=recorder)[0], policy
+
+def _mc_control(policy, n_episodes, epsilon, discount, env, first_visit,
+                exploring_starts, epsilon_schedule, seed, stop=None,
+                check_every=1000, recorder=None):
+    """mc_control which also return the counter table [s, action] and the
+    number of episodes run, it stops early when stop(Q) returns True
+    (checked every check_every episodes)"""
+
+    # Make a value table with deafult value 0.0
+    encoder = env.encoder()
+    Q = TabularValueStore(encoder, n_actions=2)
+    rng = np.random.default_rng(seed)
+    sampler = EpsilonGreedyPolicy(epsilon, 2, rng)
+
+    # Counter of every (state, action), Q and counter are index by
+    # state index and action so returns of different actions never mix
+    counter = np.zeros(Q.table.shape)
+    table = Q.table
+
+    for e in range(n_episodes):
+        if epsilon_schedule is not None:
+            sampler.epsilon = epsilon_schedule(e)
+
+        # An episode is a list of states, actions_based_on_policy and
+        # reward_after_following_action
         # Choosen action now is needed because we use Q-value
-        episode = []
-        env.reset()
+        states = []
+        actions = []
+        rewards = []
+        if exploring_starts:
+            action = exploring_start(env, rng)
+        else:
+            env.reset()
+            action = None
         now_state = env.state()
         terminate = False
 
         # Generate one episode
         while not terminate:
-            # Chosen action
-            act_prob = policy(Q, epsilon, now_state)
-            action = np.random.choice(np.arange(len(act_prob)), p=act_prob)
+            # Chosen action, the first one is random on exploring starts
+            if action is None:
+                action = policy(Q, sampler, now_state)
 
             # Take action
             next_state, done, reward = env.act(action)
 
             # Save this state
-            episode.append((now_state, action, reward))
+            states.append(encoder.index[now_state])
+            actions.append(action)
+            rewards.append(reward)
+            if recorder is not None:
+                recorder.record(states[-1], action, reward, done)
 
             # Move to the next state
             now_state = next_state
+            action = None
 
             if done:
                 terminate = True
 
+        G = discounted_returns(rewards, discount)
 
         # MC_control, done without waiting all episodes
         # Computes like MC policy evaluation
-        for i, data in enumerate(episode):
-            state = data[0]
-            action = data[1]
+        pairs = [s * 2 + a for s, a in zip(states, actions)]
+        for t in visit_steps(pairs, first_visit):
+            s, a = states[t], actions[t]
+            Q.visited[s] = True
+            counter[s, a] += 1
 
-            # data[2] is an actual reward
-            G = sum(data[2]*(discount**ix) for ix, data in enumerate(episode[i:]))
+            # Incremental average of the returns of (state, action)
+            table[s, a] += (G[t] - table[s, a]) / counter[s, a]
 
-            counter[state] += 1
-            rewardsum[state] += G
+        if stop is not None and (e + 1) % check_every == 0 and stop(Q):
+            return Q, counter, e + 1
 
-            # average
-            Q[state][action] = rewardsum[state] / counter[state]
+    return Q, counter, n_episodes
 
-    return Q, policy
+def optimal_actions(tolerance=0.0):
+    """optimal actions of every state with player score 12-21 from
+    BlackJack_DP value iteration
 
+    return dict {(state): bool array [action]} - True if the action is
+    optimal, an action less than tolerance worse than the best counts too
+    """
+    model = BlackJack_DP.get_model()
+    V, Q_opt, policy = BlackJack_DP.value_iteration(model)
+
+    # Player score 12-21 hands are never 'initial', the only observed state
+    # with two model states is soft 21 (natural or not), stick is optimal
+    # on both of them
+    optimal = {}
+    for (kind, hard, usable, d), s in model.index.items():
+        if kind == 'normal' and hard + 10 * usable >= 12:
+            optimal[model.states[s]] = Q_opt[s] >= Q_opt[s].max() - tolerance
+    return optimal
+
+def policy_mistakes(Q, optimal):
+    """number of states whose greedy action of Q is not optimal"""
+    return sum(not ok[Q.table[Q.index[state]].argmax()]
+               for state, ok in optimal.items())
+
+def benchmark_mc_control(max_episodes=1000000, check_every=10000,
+                         tolerance=0.01, seed=0):
+    """episodes needed by mc_control until its greedy policy is optimal
+    (up to tolerance) on every state with player score 12-21"""
+    optimal = optimal_actions(tolerance)
+    stop = lambda Q: policy_mistakes(Q, optimal) == 0
+
+    # name, epsilon, exploring_starts, epsilon_schedule
+    settings = [("epsilon=0.1", 0.1, False, None),
+                ("GLIE", 1.0, False, glie_schedule(half_life=100000)),
+                ("exploring starts", 0.0, True, None)]
+
+    for name, epsilon, exploring_starts, epsilon_schedule in settings:
+        bench_env = BlackJack(seed=seed)
+        Q, counter, n = _mc_control(policy_epsilon, max_episodes, epsilon,
+                                    1.0, bench_env, True, exploring_starts,
+                                    epsilon_schedule, seed, stop, check_every)
+        print("{:<18} episodes: {:>8} | mistakes: {}".format(
+                    name, n, policy_mistakes(Q, optimal)))
+
+def policy_random(pl_score, de_score, use_ace):
+    """Policy-random : hit or stick with the same probability, a behaviour
+    policy which covers every target policy"""
+    return np.array([0.5, 0.5])
+
+class EpisodeBatch(object):
+    """Episodes played by a behaviour policy, every step is kept in flat
+    arrays and episode i is the steps offsets[i] until offsets[i + 1]
+
+    states = int array - state index (env.encoder()) of every step
+    actions = int array - action taken on every step
+    rewards = float array - reward after taking the action
+    probs = float array - behaviour probability of the action taken
+    offsets = int array [n_episodes + 1] - first step of every episode
+    """
+    def __init__(self, states, actions, rewards, probs, offsets):
+        self.states = np.asarray(states, dtype=np.int64)
+        self.actions = np.asarray(actions, dtype=np.int64)
+        self.rewards = np.asarray(rewards, dtype=float)
+        self.probs = np.asarray(probs, dtype=float)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.n_episodes = len(self.offsets) - 1
+
+def collect_episodes(policy, n_episodes, env=env, seed=None):
+    """play n_episodes with behaviour policy and return an EpisodeBatch"""
+    encoder = env.encoder()
+    sampler = ProbabilitySampler(seed)
+    states, actions, rewards, probs, offsets = [], [], [], [], [0]
+
+    for e in range(n_episodes):
+        env.reset()
+        now_state = env.state()
+        terminate = False
 
-"""Block code below evaluate a policy and return a plotted V-value
-"""
-print "MONTE-CARLO EVALUATE POLICY_0"
+        while not terminate:
+            p = policy(*now_state)
+            action = sampler.sample(p)
+            next_state, done, reward = env.act(action)
 
-V = mc_prediction(policy_0, n_episodes=10000)
+            states.append(encoder.index[now_state])
+            actions.append(action)
+            rewards.append(reward)
+            probs.append(p[action])
 
-# Delete state with player score below 12 to make it same with example
-new_V = defaultdict(float)
-for key, data in V.iteritems():
-    if key[0] >= 12:
-        new_V[key] = data
+            now_state = next_state
+            if done:
+                terminate = True
 
-# Using plotting library from Denny Britz repo
-plotting.plot_value_function(new_V, title="Policy_0 Evaluation")
+        offsets.append(len(states))
 
+    return EpisodeBatch(states, actions, rewards, probs, offsets)
 
-"""Block code below optimize Q by a policy and return Q and plotted V-value
-"""
-print "MONTE-CARLO CONTROL OPTIMIZE THE POLICY AND Q-VALUE"
-Q, policy = mc_control(policy_epsilon, n_episodes=100000)
+def off_policy_prediction(policies, episodes, discount=1.0, weighted=True,
+                          env=env):
+    """Off-policy Monte-carlo prediction with importance sampling
+    (Sutton's book section 5.6), every target policy is evaluated at once
+    from the same episodes, nothing is simulated
 
+    policies = list of policy function, e.g [policy_0], which return
+               [stick_prob, hit_prob]
+    episodes = EpisodeBatch - played by a behaviour policy which has
+               probability > 0 on every action the targets can take
+    weighted = bool - weighted importance sampling if True (C is the sum of
+               W), ordinary importance sampling otherwise (C is the count)
 
-# For plotting purpose, find V-value from Q-Value
-V = defaultdict(float)
-for state, actions in Q.iteritems():
-    action_value = max(actions)
-    V[state] = action_value
+    return list of V, one for every policy
+
+    The incremental update V += W / C * (G - V) with C += W gives the
+    weighted average of the returns, so every step of the batch is done at
+    once: W and G of all steps are computed backward one step-to-the-end
+    level at a time, then they are summed per state.
+    """
+    encoder = env.encoder()
+    states = episodes.states
+
+    # Probability of every target on every (state, action) [s, action, k]
+    pi = np.array([[policy(*state) for state in encoder.states]
+                   for policy in policies], dtype=float).transpose(1, 2, 0)
+
+    # W[t] = product of pi / b from t to the end, G[t] = return after t
+    W = pi[states, episodes.actions] / episodes.probs[:, None]
+    G = episodes.rewards.copy()
+    for t in backward_levels(episodes.offsets):
+        W[t] *= W[t + 1]
+        G[t] += discount * G[t + 1]
+
+    values = []
+    for k in range(len(policies)):
+        if weighted:
+            C = np.bincount(states, W[:, k], encoder.n_states)
+        else:
+            C = np.bincount(states, None, encoder.n_states).astype(float)
+        WG = np.bincount(states, W[:, k] * G, encoder.n_states)
+
+        V = TabularValueStore(encoder)
+        V.visited = C > 0
+        V.table[V.visited] = WG[V.visited] / C[V.visited]
+        values.append(V)
+    return values
+
+def off_policy_control(episodes, discount=1.0, weighted=True, env=env):
+    """Off-policy Monte-carlo control (Sutton's book section 5.7), the
+    target policy is greedy of Q and it learns from the episodes of a
+    behaviour policy, an episode is used backward until its action is not
+    the greedy one
+
+    return Q, the target policy is the greedy action of Q
+    """
+    encoder = env.encoder()
+    Q = TabularValueStore(encoder, n_actions=2)
+    C = np.zeros(Q.table.shape)
+    table = Q.table
+    states, actions, rewards, probs = episodes.states.tolist(), \
+        episodes.actions.tolist(), episodes.rewards.tolist(), \
+        episodes.probs.tolist()
+    offsets = episodes.offsets.tolist()
+
+    for e in range(episodes.n_episodes):
+        G = 0.0
+        W = 1.0
+
+        for t in range(offsets[e + 1] - 1, offsets[e] - 1, -1):
+            s, a = states[t], actions[t]
+            G = discount * G + rewards[t]
+            Q.visited[s] = True
+
+            if weighted:
+                C[s, a] += W
+                table[s, a] += W / C[s, a] * (G - table[s, a])
+            else:
+                C[s, a] += 1
+                table[s, a] += (W * G - table[s, a]) / C[s, a]
+
+            # The target policy is greedy, its probability of a is 0 or 1
+            if a != table[s].argmax():
+                break
+            W = W / probs[t]
+
+    return Q
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Monte-carlo prediction and control on Black Jack")
+    parser.add_argument("--n-episodes", type=int, default=10000,
+                        help="number of episodes of the prediction demo")
+    parser.add_argument("--control-episodes", type=int, default=100000,
+                        help="number of episodes of the off-policy and "
+                             "control demos")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed of the environment and the policy")
+    args = parser.parse_args()
+
+    # one stream for the environment and one for every learner
+    env_seed, prediction_seed, off_policy_seed, control_seed = \
+        spawn(args.seed, 4)
+    env = BlackJack(seed=env_seed)
+
+    """Block code below evaluate a policy and return a plotted V-value
+    """
+    print("MONTE-CARLO EVALUATE POLICY_0")
+
+    V = mc_prediction(policy_0, n_episodes=args.n_episodes, env=env,
+                      seed=prediction_seed)
+
+    # Delete state with player score below 12 to make it same with example
+    new_V = defaultdict(float)
+    for key, data in V.items():
+        if key[0] >= 12:
+            new_V[key] = data
+
+    # Using plotting library from Denny Britz repo
+    plotting.plot_value_function(new_V, title="Policy_0 Evaluation")
 
-# Delete state with player score below 12 to make it same with example
-new_V = defaultdict(float)
-for key, data in V.iteritems():
-    if key[0] >= 12:
-        new_V[key] = data
 
-# Using plotting library from Denny Britz repo
-plotting.plot_value_function(new_V, title="Optimal Value Function")
+    """Block code below evaluate a policy from episodes of a random policy
+    """
+    print("OFF-POLICY MONTE-CARLO EVALUATE POLICY_0")
+
+    episodes = collect_episodes(policy_random, args.control_episodes, env=env,
+                                seed=off_policy_seed)
+    V, = off_policy_prediction([policy_0], episodes, env=env)
 
+    new_V = defaultdict(float)
+    for key, data in V.items():
+        if key[0] >= 12:
+            new_V[key] = data
 
-"""Block code below using optimized Q-value and policy before,
-Then run it on a game
-"""
-print "SIMULATE THE OPTIMIZED POLICY AND Q-VALUE"
+    plotting.plot_value_function(new_V, title="Policy_0 Off-Policy Evaluation")
 
-def print_state( pl_score, de_score, use_ace, reward=0):
-    if env.done:
-        print "== Game Over =="
-        print "Reward: {}".format(reward)
-    print "Player: {} | Dealer: {} | Usable Ace: {}".format(
-                pl_score, de_score, use_ace)
 
-    # You shouldn't print deck list
-    print "Player Deck: {}".format(env.player)
-    print "Dealer Deck: {}".format(env.dealer)
+    """Block code below optimize Q by a policy and return Q and plotted V-value
+    """
+    print("MONTE-CARLO CONTROL OPTIMIZE THE POLICY AND Q-VALUE")
+    Q, policy = mc_control(policy_epsilon, n_episodes=args.control_episodes,
+                           env=env, seed=control_seed)
 
-def act(hit, env=env):
-    state, done, reward = env.act(hit)
-    pl_score, de_score, use_ace = state
-    print_state(pl_score, de_score, use_ace, reward)
-    return state, done, reward
 
-def reset(env=env):
-    env.reset()
-    pl_score, de_score, use_ace = env.state()
-    print_state(pl_score, de_score, use_ace)
-    return pl_score, de_score, use_ace
+    # For plotting purpose, find V-value from Q-Value
+    V = defaultdict(float)
+    for state, actions in Q.items():
+        action_value = max(actions)
+        V[state] = action_value
+
+    # Delete state with player score below 12 to make it same with example
+    new_V = defaultdict(float)
+    for key, data in V.items():
+        if key[0] >= 12:
+            new_V[key] = data
 
-state = reset()
-done = False
-while not done:
-    print ""
-    act_prob = policy(Q, 0.1, state)
-    action = np.random.choice(np.arange(len(act_prob)), p=act_prob)
-    print "action: HIT" if action==1 else "action: STICK"
-    state, done, reward = act(action)
+    # Using plotting library from Denny Britz repo
+    plotting.plot_value_function(new_V, title="Optimal Value Function")
+
+
+    """Block code below using optimized Q-value and policy before,
+    Then run it on a game
+    """
+    print("SIMULATE THE OPTIMIZED POLICY AND Q-VALUE")
+
+    def print_state( pl_score, de_score, use_ace, reward=0):
+        if env.done:
+            print("== Game Over ==")
+            print("Reward: {}".format(reward))
+        print("Player: {} | Dealer: {} | Usable Ace: {}".format(
+                    pl_score, de_score, use_ace))
+
+        # You shouldn't print deck list
+        print("Player Deck: {}".format(env.player))
+        print("Dealer Deck: {}".format(env.dealer))
+
+    def act(hit, env=env):
+        state, done, reward = env.act(hit)
+        pl_score, de_score, use_ace = state
+        print_state(pl_score, de_score, use_ace, reward)
+        return state, done, reward
+
+    def reset(env=env):
+        env.reset()
+        pl_score, de_score, use_ace = env.state()
+        print_state(pl_score, de_score, use_ace)
+        return pl_score, de_score, use_ace
+
+    state = reset()
+    done = False
+    sampler = EpsilonGreedyPolicy(0.1, 2)
+    while not done:
+        print("")
+        action = policy(Q, sampler, state)
+        print("action: HIT" if action==1 else "action: STICK")
+        state, done, reward = act(action)
@@ -1,166 +1,212 @@
 import numpy as np
 
 from collections import defaultdict
+from BlackJack_env import BlackJack
 from lib import plotting
+from lib.policy import EpsilonGreedyPolicy, ProbabilitySampler
+from lib.seeding import spawn
+from lib.tabular import TabularValueStore
+from lib.traces import EligibilityTraces
 
-deck = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10]
-
-class BlackJack(object):
-    """Create an environment of a Black Jack Game
-
-    dealer = list - dealer list card in his deck
-    player = list - player list card in his deck
-    done = bool - True if the game is done, and False otherwise
-
-    this class only can be accessed from act(), reset(), state()
-
-    act() = PARAMS : 1 if hit, 0 if stick
-            RETURN : (state), done_status, reward
-
-    reset() = PARAMS : None
-              RETURN : None
+env = BlackJack()
 
-    state() = PARAMS : None
-             RETURN : (state)
+def policy_0(pl_score, de_score, use_ace):
+    """Policy-0 : always "hit" except we got score >= 20
+    """
 
-    (state) is a tuple of player score, dealers score, usable ace condition
+    # Using probability instead of actual act number for consistency
+    return np.array([1.0, 0.0]) if pl_score >= 20 else np.array([0.0, 1.0])
 
-    Black Jack Refferences:
-    [1] https://webdocs.cs.ualberta.ca/~sutton/book/ebook/node51.html (Example 5.1)
-    [2] http://www.bicyclecards.com/how-to-play/blackjack/
+def policy_epsilon(Q, sampler, state):
+    """Policy-epsilon :
+	   - always hit when player score < 12
+	   - otherwise sampler (lib.policy.EpsilonGreedyPolicy) choose:
+		   - epsilon probability choosing random action
+		   - 1-epsilon probability choosing action wich has maximum Q value
     """
-    def __init__(self):
-        self.reset()
-
-    def reset(self):
-        self.dealer = [self.draw()]
-        self.player = [self.draw()]
-        self.done = False
-
-    def natural(self,hand): # check if he got natural/blackjack condition
-        return sorted(hand)==[1,10]
-
-    def draw(self): # get one card
-        return np.random.choice(deck)
-
-    def usable(self, hand): # check if he got usable ace condition
-        return 1 in hand and sum(hand) + 10 <= 21
-
-    def busted(self, hand): # check if he got busted
-        return self.sum_hand(hand) > 21
-
-    def sum_hand(self, hand):
-        if self.usable(hand):
-            return sum(hand) + 10
-        else:
-            return sum(hand)
-
-    def state(self):
-        return self.sum_hand(self.player), self.sum_hand(self.dealer), \
-                    self.usable(self.player)
-
-    def act(self, hit):
-        if not self.done:
-            if hit:
-                self.hit()
-                if self.busted(self.player):
-                    self.done = True
-                    return self.state(), self.done, -1
-                else:
-                    return self.state(), self.done, 0
-            else:
-                return self.stick()
 
-    def hit(self):
-        self.player.append(self.draw())
+    # Greedy choose hit when score < 12
+    if state[0] < 12:
+        return 1
 
-    def stick(self):
-        self.done = True
+    return sampler.sample(Q[state])
 
-        # Dealer doing hit while his score below 17
-        # see refference [2]
-        while self.sum_hand(self.dealer) < 17:
-            self.dealer.append(self.draw())
+def tdlambda_prediction(policy, n_episodes, alfa=1.0, discount=1.0, lmbd=0.8,
+                        env=env, trace='accumulating', threshold=1e-4,
+                        recorder=None, seed=None, backend='auto'):
+    """TD-lambda prediction (backward view)
 
-        # player'll never get busted in here so just sum it
-        player_score = self.sum_hand(self.player)
+    trace = str - 'accumulating', 'replacing' or 'dutch' eligibility trace
+    threshold = float - trace smaller than this is dropped
+    recorder = lib.replay.EpisodeRecorder - every step is recorded if given
+    seed = int, SeedSequence or Generator - seed of action choosing
+    backend = str - 'auto', 'jit' or 'python' (lib.jit.backends), the
+              kernel only runs accumulating traces without a recorder, it
+              gives the same V as the Python learner
+    """
+    if backend != 'python':
+        from lib import jit
+        if jit.use_kernel(backend, trace == 'accumulating' and
+                          recorder is None):
+            return jit.blackjack_td_prediction(env, policy, n_episodes, alfa,
+                                               discount, lmbd, threshold, seed)
+
+    # Make a value table with deafult value 0.0
+    encoder = env.encoder()
+    index = encoder.index
+    V = TabularValueStore(encoder)
+    table = V.table
+    Z = EligibilityTraces(encoder.n_states, trace, threshold)
+    sampler = ProbabilitySampler(seed)
+
+    for e in range(n_episodes):
+        env.reset()
+        now_state = env.state()
+        s = index[now_state]
+        terminate = False
+        Z.reset()
 
-        dealer_score = -1 if self.busted(self.dealer) else self.sum_hand(self.dealer)
+        # Running an episode
+        while not terminate:
+            # Chosen action
+            action = sampler.sample(policy(*now_state))
+            V.visited[s] = True
 
-        if self.natural(self.player) and self.natural(self.dealer):
-            reward = 1
-        elif self.natural(self.player):
-            reward = 1.5
-        elif dealer_score > player_score:
-            reward = -1
-        elif dealer_score < player_score:
-            reward = 1
-        else:
-            reward = 0
+            # Take action
+            next_state, done, reward = env.act(action)
+            if recorder is not None:
+                recorder.record(s, action, reward, done)
 
-        return self.state(), self.done, reward
+            # the value of the final state is 0
+            if done:
+                delta = reward - table[s]
+                terminate = True
+            else:
+                s_new = index[next_state]
+                delta = reward + discount * table[s_new] - table[s]
+            Z.visit(s, alfa)
 
+            # Not waiting to generate one episode for TD update,
+            # all states which have been through in the episode at once
+            Z.update(table, alfa * delta, lmbd * discount)
 
-env = BlackJack()
+            # Move to the next state
+            if not done:
+                now_state = next_state
+                s = s_new
 
-def policy_0(pl_score, de_score, use_ace):
-    """Policy-0 : always "hit" except we got score >= 20
-    """
+    return V
 
-    # Using probability instead of actual act number for consistency
-    return np.array([1.0, 0.0]) if pl_score >= 20 else np.array([0.0, 1.0])
+# tdlambda_control a.k.a SARSA(lambda)
+def tdlambda_control(policy, n_episodes, alfa=0.1, epsilon=0.1, discount=1.0,
+                     lmbd=0.8, env=env, trace='replacing', threshold=1e-4,
+                     recorder=None, seed=None):
 
-def tdlambda_prediction(policy, n_episodes, alfa=1.0, discount=1.0, lmbd=0.8, env=env):
+    # Make a value table with deafult value 0.0
+    encoder = env.encoder()
+    index = encoder.index
+    Q = TabularValueStore(encoder, n_actions=2)
+    table = Q.table
+    sampler = EpsilonGreedyPolicy(epsilon, 2, seed)
+    Z = EligibilityTraces(encoder.n_states * 2, trace, threshold)
 
-    # Make a dictionary with deafult value 0.0
-    V = defaultdict(float)
+    # Trace of (state, action) is on index state * 2 + action
+    flat_Q = table.reshape(-1)
 
-    for e in xrange(n_episodes):
+    for e in range(n_episodes):
         env.reset()
         now_state = env.state()
+        s = index[now_state]
         terminate = False
-        Z = defaultdict(float)
-        States = [] # all states have been through in the episode
+        Z.reset()
+
+        # Chosen action
+        action = policy(Q, sampler, now_state)
 
         # Running an episode
         while not terminate:
-            # Chosen action
-            act_prob = policy(*now_state)
-            action = np.random.choice(np.arange(len(act_prob)), p=act_prob)
+            Q.visited[s] = True
 
             # Take action
             next_state, done, reward = env.act(action)
-            delta = reward + discount * V[next_state] - V[now_state]
-            Z[now_state] = Z[now_state] + 1
-            States.append(now_state)
+            if recorder is not None:
+                recorder.record(s, action, reward, done)
 
-            # Not waiting to generate one episode for TD update
-            for s in States:
-                V[s] = V[s] + alfa * delta * Z[s]
-                Z[s] = lmbd * discount * Z[s]
+            # the value of the final state is 0
+            if done:
+                delta = reward - table[s, action]
+                terminate = True
+            else:
+                # Get next action
+                s_new = index[next_state]
+                next_action = policy(Q, sampler, next_state)
+                delta = reward + discount * table[s_new, next_action] \
+                                                - table[s, action]
+            Z.visit(s * 2 + action, alfa)
+            Z.update(flat_Q, alfa * delta, lmbd * discount)
 
             # Move to the next state
-            now_state = next_state
+            if not done:
+                now_state = next_state
+                s = s_new
+                action = next_action
 
-            if done:
-                terminate = True
+    return Q, policy
 
-    return V
 
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="TD-lambda prediction and SARSA(lambda) on Black Jack")
+    parser.add_argument("--n-episodes", type=int, default=10000,
+                        help="number of episodes of every demo")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed of the environment and the policy")
+    args = parser.parse_args()
+
+    # one stream for the environment and one for every learner
+    env_seed, prediction_seed, control_seed = spawn(args.seed, 3)
+    env = BlackJack(seed=env_seed)
+
+    """Block code below evaluate a policy and return a plotted V-value
+    """
+    print("TEMPORAL-DIFFERENCE-LAMBDA EVALUATE POLICY_0")
+
+    V = tdlambda_prediction(policy_0, n_episodes=args.n_episodes, env=env,
+                            seed=prediction_seed)
+
+    # Delete state with player score below 12 to make it same with example
+    # Because we call V[next_state] in the end, to make the same plot
+    # we should delete some keys
+    new_V = defaultdict(float)
+    for key, data in V.items():
+        if key[0] >= 12 and key[1]<=11:
+            new_V[key] = data
 
-"""Block code below evaluate a policy and return a plotted V-value
-"""
-print "TEMPORAL-DIFFERENCE-LAMBDA EVALUATE POLICY_0"
+    # Using plotting library from Denny Britz repo
+    plotting.plot_value_function(new_V, title="Policy_0 Evaluation")
 
-V = tdlambda_prediction(policy_0, n_episodes=10000)
 
-# Delete state with player score below 12 to make it same with example
-# Because we call V[next_state] in the end, to make the same plot
-# we should delete some keys
-new_V = defaultdict(float)
-for key, data in V.iteritems():
-    if key[0] >= 12 and key[1]<=11:
-        new_V[key] = data
+    """Block code below optimize Q by a policy and return Q and plotted V-value
+    """
+    print("TEMPORAL-DIFFERENCE-LAMBDA CONTROL A.K.A SARSA(LAMBDA) OPTIMIZE THE POLICY AND Q-VALUE")
+
+    Q, policy = tdlambda_control(policy_epsilon, n_episodes=args.n_episodes,
+                                 env=env, seed=control_seed)
 
-# Using plotting library from Denny Britz repo
-plotting.plot_value_function(new_V, title="Policy_0 Evaluation")
+    # For plotting purpose, find V-value from Q-Value
+    V = defaultdict(float)
+    for state, actions in Q.items():
+        action_value = max(actions)
+        V[state] = action_value
+
+    # Delete state with player score below 12 and dealer more than 11
+    # to make it same with example
+    new_V = defaultdict(float)
+    for key, data in V.items():
+        if key[0] >= 12 and key[1]<=11 and key[0]<=21:
+            new_V[key] = data
+
+    # Using plotting library from Denny Britz repo
+    plotting.plot_value_function(new_V, title="Optimal Value Function")
@@ -1,13 +1,41 @@
 import numpy as np
+import time
+
+from lib.buffers import RandomBuffer
+from lib.tabular import StateEncoder
 
 deck = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10]
 
+class CardSource(RandomBuffer):
+    """Create a seeded stream of cards
+
+    Cards are generated block by block, one Generator.integers call makes
+    block_size card indices, then they are handed out one by one and a new
+    block is made only when the old one is used up.
+
+    seed = int, SeedSequence or Generator - seed of the stream
+    block_size = int - number of cards generated at once
+
+    draw() = PARAMS : None
+             RETURN : one card
+
+    draw_many() = PARAMS : n - number of cards
+                  RETURN : array of n cards
+    """
+    def __init__(self, seed=None, block_size=65536):
+        self.deck = np.array(deck)
+        super(CardSource, self).__init__(self.cards, seed, block_size)
+
+    def cards(self, rng, size): # one block of cards
+        return self.deck[rng.integers(len(self.deck), size=size)]
+
 class BlackJack(object):
     """Create an environment of a Black Jack Game
 
     dealer = list - dealer list card in his deck
     player = list - player list card in his deck
     done = bool - True if the game is done, and False otherwise
+    nAction = int - number of actions (stick and hit)
 
     this class only can be accessed from act(), reset(), state()
 
@@ -17,16 +45,30 @@ class BlackJack(object):
     reset() = PARAMS : None
               RETURN : None
 
+    reset_to() = PARAMS : player score (12-21), dealer card (1-10),
+                          usable ace condition
+                 RETURN : None
+
     state() = PARAMS : None
              RETURN : (state)
 
+    encoder() = PARAMS : None
+                RETURN : StateEncoder of every (state)
+
     (state) is a tuple of player score, dealers score, usable ace condition
 
+    cards = CardSource - where the cards are drawn from, a new CardSource
+            is made if it is None
+    seed = int, SeedSequence or Generator - seed of the new CardSource
+
     Black Jack Refferences:
     [1] https://webdocs.cs.ualberta.ca/~sutton/book/ebook/node51.html (Example 5.1)
     [2] http://www.bicyclecards.com/how-to-play/blackjack/
     """
-    def __init__(self):
+    nAction = 2
+
+    def __init__(self, cards=None, seed=None):
+        self.cards = CardSource(seed) if cards is None else cards
         self.reset()
 
     def reset(self):
@@ -34,11 +76,23 @@ class BlackJack(object):
         self.player = [self.draw()]
         self.done = False
 
+    def reset_to(self, pl_score, de_card, use_ace):
+        # start from a chosen state (e.g exploring starts), the player hand
+        # is never a natural so the game is the same as reaching the state
+        if use_ace:
+            rest = [pl_score - 11] if pl_score < 21 else [5, 5]
+            self.player = [1] + rest
+        else:
+            rest = [pl_score - 10] if pl_score < 21 else [5, 6]
+            self.player = [10] + rest
+        self.dealer = [de_card]
+        self.done = False
+
     def natural(self,hand): # check if he got natural/blackjack condition
         return sorted(hand)==[1,10]
 
     def draw(self): # get one card
-        return np.random.choice(deck)
+        return self.cards.draw()
 
     def usable(self, hand): # check if he got usable ace condition
         return 1 in hand and sum(hand) + 10 <= 21
@@ -56,6 +110,10 @@ class BlackJack(object):
         return self.sum_hand(self.player), self.sum_hand(self.dealer), \
                     self.usable(self.player)
 
+    def encoder(self):
+        # player can reach 31 by hitting on 21, dealer stops below 27
+        return StateEncoder([range(32), range(32), [False, True]])
+
     def act(self, hit):
         if not self.done:
             if hit:
@@ -98,6 +156,138 @@ class BlackJack(object):
         return self.state(), self.done, reward
 
 
+class BatchBlackJack(object):
+    """Create n_envs Black Jack Games which are played at once
+
+    Every hand is kept as NumPy arrays instead of python lists, a hand is
+    summarized by its hard sum (ace counted as 1), an ace flag and the
+    number of cards, that is enough to know usable ace and natural condition.
+
+    player_hard, dealer_hard = int array - hard sum of each hand
+    player_ace, dealer_ace = bool array - True if the hand has an ace
+    player_ncard, dealer_ncard = int array - number of cards in each hand
+    done = bool array - True if the game is done (only inside act())
+
+    act() = PARAMS : array of actions, 1 if hit, 0 if stick
+            RETURN : (states), done_status, reward
+
+    reset() = PARAMS : mask - bool array, which games to reset (default all)
+              RETURN : None
+
+    state() = PARAMS : None
+              RETURN : (states)
+
+    (states) is a tuple of player score, dealers score, usable ace arrays.
+    The game rules are the same as BlackJack so the outcome distribution
+    is the same as playing n_envs BlackJack one by one.
+
+    act() returns the state reached by the action (for a finished game it
+    is the final state, same as BlackJack.act), then every finished game is
+    reset automatically, so state() after act() gives the states to act on.
+
+    cards = CardSource - where the cards are drawn from, a new CardSource
+            is made if it is None
+    seed = int, SeedSequence or Generator - seed of the new CardSource
+    """
+    def __init__(self, n_envs, cards=None, seed=None):
+        self.n_envs = n_envs
+        self.cards = CardSource(seed) if cards is None else cards
+
+        self.player_hard = np.zeros(n_envs, dtype=np.int64)
+        self.player_ace = np.zeros(n_envs, dtype=bool)
+        self.player_ncard = np.zeros(n_envs, dtype=np.int64)
+        self.dealer_hard = np.zeros(n_envs, dtype=np.int64)
+        self.dealer_ace = np.zeros(n_envs, dtype=bool)
+        self.dealer_ncard = np.zeros(n_envs, dtype=np.int64)
+        self.done = np.zeros(n_envs, dtype=bool)
+        self.reset()
+
+    def reset(self, mask=None):
+        if mask is None:
+            mask = np.ones(self.n_envs, dtype=bool)
+        n = np.count_nonzero(mask)
+
+        card = self.draw(n)
+        self.dealer_hard[mask] = card
+        self.dealer_ace[mask] = card == 1
+        self.dealer_ncard[mask] = 1
+
+        card = self.draw(n)
+        self.player_hard[mask] = card
+        self.player_ace[mask] = card == 1
+        self.player_ncard[mask] = 1
+
+        self.done[mask] = False
+
+    def draw(self, n): # get n cards
+        return self.cards.draw_many(n)
+
+    def sum_hand(self, hard, ace): # usable ace is counted as 11
+        return np.where(self.usable(hard, ace), hard + 10, hard)
+
+    def usable(self, hard, ace): # check usable ace condition
+        return ace & (hard + 10 <= 21)
+
+    def natural(self, hard, ace, ncard): # check natural/blackjack condition
+        return (ncard == 2) & ace & (hard == 11)
+
+    def state(self):
+        return (self.sum_hand(self.player_hard, self.player_ace),
+                self.sum_hand(self.dealer_hard, self.dealer_ace),
+                self.usable(self.player_hard, self.player_ace))
+
+    def act(self, hit):
+        hit = np.asarray(hit, dtype=bool)
+        reward = np.zeros(self.n_envs)
+
+        # Player doing hit
+        n = np.count_nonzero(hit)
+        card = self.draw(n)
+        self.player_hard[hit] += card
+        self.player_ace[hit] |= card == 1
+        self.player_ncard[hit] += 1
+
+        busted = hit & (self.sum_hand(self.player_hard, self.player_ace) > 21)
+        reward[busted] = -1
+
+        # Player doing stick, dealer doing hit while his score below 17
+        # see refference [2]
+        stick = ~hit
+        drawing = stick.copy()
+        while True:
+            drawing &= self.sum_hand(self.dealer_hard, self.dealer_ace) < 17
+            n = np.count_nonzero(drawing)
+            if n == 0:
+                break
+            card = self.draw(n)
+            self.dealer_hard[drawing] += card
+            self.dealer_ace[drawing] |= card == 1
+            self.dealer_ncard[drawing] += 1
+
+        player_score = self.sum_hand(self.player_hard, self.player_ace)
+        dealer_score = self.sum_hand(self.dealer_hard, self.dealer_ace)
+        dealer_score = np.where(dealer_score > 21, -1, dealer_score)
+
+        player_natural = self.natural(self.player_hard, self.player_ace,
+                                      self.player_ncard)
+        dealer_natural = self.natural(self.dealer_hard, self.dealer_ace,
+                                      self.dealer_ncard)
+
+        stick_reward = np.sign(player_score - dealer_score).astype(float)
+        stick_reward[player_natural] = 1.5
+        stick_reward[player_natural & dealer_natural] = 1
+        reward[stick] = stick_reward[stick]
+
+        self.done = busted | stick
+        states = self.state()
+        done = self.done.copy()
+
+        # Start a new game for every finished game
+        self.reset(done)
+
+        return states, done, reward
+
+
 """Below is an example how to use black jack environment
 
 Run this code in intrepreter and there are 2 actions:
@@ -109,14 +299,14 @@ env = BlackJack()
 
 def print_state( pl_score, de_score, use_ace, reward=0):
     if env.done:
-        print "== Game Over =="
-        print "Reward: {}".format(reward)
-    print "Player: {} | Dealer: {} | Usable Ace: {}".format(
-                pl_score, de_score, use_ace)
+        print("== Game Over ==")
+        print("Reward: {}".format(reward))
+    print("Player: {} | Dealer: {} | Usable Ace: {}".format(
+                pl_score, de_score, use_ace))
 
     # You shouldn't print deck list
-    print "Player Deck: {}".format(env.player)
-    print "Dealer Deck: {}".format(env.dealer)
+    print("Player Deck: {}".format(env.player))
+    print("Dealer Deck: {}".format(env.dealer))
 
 def act(hit, env=env):
     state, done, reward = env.act(hit)
@@ -127,3 +317,30 @@ def reset(env=env):
     env.reset()
     pl_score, de_score, use_ace = env.state()
     print_state(pl_score, de_score, use_ace)
+
+
+def benchmark_draws(n_draws=1000000):
+    """Compare draws per second of np.random.choice and CardSource"""
+    start = time.time()
+    for _ in range(n_draws):
+        np.random.choice(deck)
+    choice_rate = n_draws / (time.time() - start)
+
+    cards = CardSource(seed=0)
+    start = time.time()
+    for _ in range(n_draws):
+        cards.draw()
+    draw_rate = n_draws / (time.time() - start)
+
+    start = time.time()
+    cards.draw_many(n_draws)
+    draw_many_rate = n_draws / (time.time() - start)
+
+    print("np.random.choice     : {:.0f} draws/sec".format(choice_rate))
+    print("CardSource.draw      : {:.0f} draws/sec".format(draw_rate))
+    print("CardSource.draw_many : {:.0f} draws/sec".format(draw_many_rate))
+
+    return choice_rate, draw_rate, draw_many_rate
+
+if __name__ == "__main__":
+    benchmark_draws()
@@ -1,4 +1,7 @@
+import heapq
 import numpy as np
+import time
+import warnings
 
 nAction = 4
 UP = 0
@@ -17,18 +20,35 @@ class GridWorld(object):
               from different action
 
     R = dict {(s):reward} - reward matrix, reward which obtained on state s
+
+    The same dynamics are also kept as arrays, state (row, col) has
+    index row * n_col + col:
+    next_state = int array [s, a, k] - k-th possible next state of s using a
+    prob = float array [s, a, k] - probability of that next state
+    reward = float array [s] - reward which obtained on state s
+    is_terminal = bool array [s] - True if s is a goal state
+
+    sparse = bool - if True P and R dicts are not built (they are too big for
+             a very large grid), use sparse_matrix() and array functions
     """
 
-    def __init__(self, shape=(4, 4), terminate=[(3, 3)]):
+    def __init__(self, shape=(4, 4), terminate=[(3, 3)], sparse=False):
         self.shape = shape
         self.P = {}
         self.R = {}
         self.terminate = terminate
+        self.sparse = sparse
+
+        self.build_arrays()
+        if sparse:
+            self.P = None
+            self.R = None
+            return
 
-        for i in xrange(self.shape[0]):
-            for j in xrange(self.shape[1]):
+        for i in range(self.shape[0]):
+            for j in range(self.shape[1]):
                 self.P[(i, j)] = {}
-                for a in xrange(nAction):
+                for a in range(nAction):
                     if (i, j) in self.terminate:
                         self.P[(i, j)][a] = {(i, j, UP): 1, (i, j, LEFT): 1,
                                            (i, j, DOWN): 1, (i, j, RIGHT): 1}
@@ -42,11 +62,66 @@ class GridWorld(object):
 
                 self.R[(i, j)] = 0 if (i, j) in self.terminate else -1
 
+    def build_arrays(self):
+        """build next_state, prob, reward and is_terminal arrays at once"""
+        n_row, n_col = self.shape
+        nS = n_row * n_col
+        i, j = np.divmod(np.arange(nS), n_col)
+
+        next_state = np.empty((nS, nAction), dtype=np.int64)
+        next_state[:, UP] = np.maximum(i - 1, 0) * n_col + j
+        next_state[:, LEFT] = i * n_col + np.maximum(j - 1, 0)
+        next_state[:, DOWN] = np.minimum(i + 1, n_row - 1) * n_col + j
+        next_state[:, RIGHT] = i * n_col + np.minimum(j + 1, n_col - 1)
+
+        self.is_terminal = np.zeros(nS, dtype=bool)
+        for t in self.terminate:
+            self.is_terminal[t[0] * n_col + t[1]] = True
+
+        # goal state stays on itself
+        terminal = np.flatnonzero(self.is_terminal)
+        next_state[terminal] = terminal[:, None]
+
+        # every action has one next state in Grid World
+        self.next_state = next_state[:, :, None]
+        self.prob = np.ones(self.next_state.shape)
+        self.reward = np.where(self.is_terminal, 0.0, -1.0)
+        self.nS = nS
+        self._sparse_P = None
+
+    def sparse_matrix(self):
+        """transition matrix as scipy CSR matrix [s * nAction + a, s'],
+        it is built once from next_state and prob arrays"""
+        if self._sparse_P is None:
+            from scipy import sparse
+
+            k = self.next_state.shape[2]
+            n_row = self.nS * nAction
+            self._sparse_P = sparse.csr_matrix(
+                (self.prob.ravel(), self.next_state.ravel(),
+                 np.arange(0, n_row * k + 1, k)), shape=(n_row, self.nS))
+            self._sparse_P.sum_duplicates()
+
+        return self._sparse_P
+
+    def policy_matrix(self, policy):
+        """transition matrix of following policy [s, s'] as CSR matrix
+
+        policy = array [s, a] - probability from state s choosing action a
+        """
+        from scipy import sparse
+
+        Pi = sparse.csr_matrix(
+            (policy.ravel(), np.arange(self.nS * nAction),
+             np.arange(0, self.nS * nAction + 1, nAction)),
+            shape=(self.nS, self.nS * nAction))
+        return Pi.dot(self.sparse_matrix()).tocsr()
+
 
 def value_to_array(V, shape=(4,4)):
     """dict V to array V"""
     array_V = np.zeros(shape)
-    for key, value in V.iteritems():
+    for key, value in V.items():
         array_V[key[0]][key[1]]=value
 
     return array_V
@@ -54,9 +129,9 @@ def value_to_array(V, shape=(4,4)):
 def policy_to_array(policy, shape=(4,4)):
     """dict policy to array policy"""
     array_policy = np.zeros(shape)
-    for key, action in policy.iteritems():
+    for key, action in policy.items():
         best_a = 0
-        for a  in xrange(nAction):
+        for a  in range(nAction):
             if policy[key][a] > policy[key][best_a]:
                 best_a = a
 
@@ -64,11 +139,25 @@ def policy_to_array(policy, shape=(4,4)):
 
     return array_policy
 
+def value_to_dict(V, shape=(4,4)):
+    """array V (flat or 2D) to dict V"""
+    V = np.reshape(V, shape)
+    return {(i,j): V[i, j] for j in range(shape[1]) for i in range(shape[0])}
+
+def policy_dict_to_array(policy, shape=(4,4)):
+    """dict policy to array policy [s, a], s = row * n_col + col"""
+    array_policy = np.zeros((shape[0] * shape[1], nAction))
+    for key, action_prob in policy.items():
+        for a in range(nAction):
+            array_policy[key[0] * shape[1] + key[1], a] = action_prob[a]
+
+    return array_policy
+
 def value_to_policy(V, shape=(4,4)):
     """given V generate the policy using greedy method"""
     policy = {}
-    for i in xrange(shape[0]):
-        for j in xrange(shape[1]):
+    for i in range(shape[0]):
+        for j in range(shape[1]):
             policy[(i,j)] = {}
             best_v = -10000000
             best_a = 0
@@ -86,7 +175,7 @@ def value_to_policy(V, shape=(4,4)):
                 best_v = V[(i, min(j+1, shape[1]-1))]
                 best_a = RIGHT
 
-            for a in xrange(nAction):
+            for a in range(nAction):
                 policy[(i,j)][a]=1 if a==best_a else 0
 
     return policy
@@ -100,29 +189,31 @@ def policy_0(shape=(4, 4)):
     policy_0 has an equal probability
     """
     policy = {}
-    for i in xrange(shape[0]):
-        for j in xrange(shape[1]):
+    for i in range(shape[0]):
+        for j in range(shape[1]):
             policy[(i, j)] = {0: .25, 1: .25, 2: .25, 3: .25}
 
     return policy
 
-def policy_1(shape=(4, 4)):
+def policy_1(shape=(4, 4), seed=None):
     """policy method return a dictionary
 
     policy = dictionary {s:{a:prob}} - a probability from state s
         choosing action a
 
     policy_1 has a random probability
+    seed = int, SeedSequence or Generator - seed of the probabilities
     """
+    rng = np.random.default_rng(seed)
     policy = {}
-    for i in xrange(shape[0]):
-        for j in xrange(shape[1]):
+    for i in range(shape[0]):
+        for j in range(shape[1]):
             policy[(i, j)] = {}
 
-            action_prob = np.random.rand(nAction)
+            action_prob = rng.random(nAction)
             action_prob = action_prob / np.sum(action_prob)
 
-            for a in xrange(nAction):
+            for a in range(nAction):
                 policy[(i, j)][a] = action_prob[a]
 
     return policy
@@ -136,30 +227,38 @@ def policy_2(shape=(4, 4)):
     policy_2 has an equal probability but only going to north and west
     """
     policy = {}
-    for i in xrange(shape[0]):
-        for j in xrange(shape[1]):
+    for i in range(shape[0]):
+        for j in range(shape[1]):
             policy[(i,j)] = {0: .5, 1: .5, 2: 0, 3: 0}
 
     return policy
 
-def policy_evaluation(policy, env, discount=1, shape=(4,4), epsilon=0.00001):
+def policy_evaluation(policy, env, discount=1, shape=(4,4), epsilon=0.00001,
+                      method='iterative'):
     """policy evaluation from Sutton's Book
 
     V = tuple (row,vcol) - value of state s (row, col)
     newVal = scalar - for temporary new value of state s
+    method = str - 'iterative' sweeps on the dicts, other methods are done
+             by policy_evaluation_array
     """
+    if method != 'iterative':
+        V = policy_evaluation_array(policy_dict_to_array(policy, shape), env,
+                                    discount, epsilon, method)
+        return value_to_dict(V, shape)
+
     # create 0 value function
-    V = {(i,j): 0 for j in xrange(shape[1]) for i in xrange(shape[0])}
+    V = {(i,j): 0 for j in range(shape[1]) for i in range(shape[0])}
 
     while True:
         last_V = V.copy()
         eror = 0
 
         # Bellman Expected Equation
-        for i in xrange(shape[0]):
-            for j in xrange(shape[1]):
+        for i in range(shape[0]):
+            for j in range(shape[1]):
                 new_val = 0
-                for a in xrange(nAction):
+                for a in range(nAction):
                     for s_new in env.P[(i, j)][a]:
                         next_state = (s_new[0], s_new[1])
                         new_val += (policy[(i, j)][a] *
@@ -173,16 +272,20 @@ def policy_evaluation(policy, env, discount=1, shape=(4,4), epsilon=0.00001):
 
     return V
 
-def policy_iteration(policy, env, shape=(4,4), discount=1):
-    """policy iteration from Sutton's Book"""
+def policy_iteration(policy, env, shape=(4,4), discount=1, method='iterative'):
+    """policy iteration from Sutton's Book
+
+    method = str - policy evaluation method, 'auto' uses the fastest linear
+             solve method timed by fastest_evaluation_method
+    """
     while True:
 
         # Evaluate/generate value V based on policy
-        V = policy_evaluation(policy, env)
+        V = policy_evaluation(policy, env, discount, shape, method=method)
         last_policy = policy.copy()
 
         # Generate new policy based on generated value V
-        policy = value_to_policy(V)
+        policy = value_to_policy(V, shape)
 
         # If converged
         if last_policy==policy:
@@ -190,22 +293,23 @@ def policy_iteration(policy, env, shape=(4,4), discount=1):
 
     return policy, V
 
-def value_iteration(env, shape=(4,4), discount=1):
-    """value iteration from Sutton's Book"""
+def value_iteration(env, shape=(4,4), discount=1, epsilon=0.00001):
+    """value iteration from Sutton's Book, V is updated in place and it stops
+    when no value changes more than epsilon in one sweep"""
 
     # Create random value function on every state
-    V = {(i,j): 0 for j in xrange(shape[1]) for i in xrange(shape[0])}
+    V = {(i,j): 0 for j in range(shape[1]) for i in range(shape[0])}
 
     while True:
-        last_V = V.copy()
+        eror = 0
 
         # Create new value function
-        for i in xrange(shape[0]):
-            for j in xrange(shape[1]):
+        for i in range(shape[0]):
+            for j in range(shape[1]):
                 best_val = -1000000
 
                 # choose only the best action
-                for a in xrange(nAction):
+                for a in range(nAction):
                     new_val=0
                     for s_new in env.P[(i, j)][a]:
                         next_state = (s_new[0], s_new[1])
@@ -213,11 +317,453 @@ def value_iteration(env, shape=(4,4), discount=1):
                                 discount * V[next_state])
                     best_val = max(new_val, best_val)
 
+                eror = max(eror, np.abs(best_val - V[(i, j)]))
                 V[(i,j)] = best_val
 
         # If converged
-        if last_V == V:
+        if eror < epsilon:
+            break
+
+    return V
+
+evaluation_methods = ('iterative', 'direct', 'sparse_direct', 'krylov')
+solve_methods = ('direct', 'sparse_direct', 'krylov')
+
+# 'direct' builds a dense [s, s'] matrix, it is not timed on larger grids
+max_direct_states = 4096
+
+# fastest solve method of every (number of states, discount), see
+# fastest_evaluation_method
+fastest_methods = {}
+
+def policy_reward(policy, env):
+    """expected reward R_pi [s] of following policy"""
+    return env.reward * np.sum(policy[:, :, None] * env.prob, axis=(1, 2))
+
+def dense_policy_matrix(policy, env):
+    """transition matrix of following policy [s, s'] as dense array"""
+    P_pi = np.zeros((env.nS, env.nS))
+    rows = np.repeat(np.arange(env.nS), env.next_state[0].size)
+    np.add.at(P_pi, (rows, env.next_state.ravel()),
+              (policy[:, :, None] * env.prob).ravel())
+    return P_pi
+
+def policy_evaluation_array(policy, env, discount=1, epsilon=0.00001,
+                            method='iterative'):
+    """policy evaluation from Sutton's Book using env arrays
+
+    policy = array [s, a] - probability from state s choosing action a
+    V = array [s] - value of state s
+    method = str - how V is computed
+        'iterative'     - sweeps until V changes less than epsilon,
+                          one sweep updates every state at once
+        'direct'        - one dense linear solve of (I - discount P_pi)V = R_pi
+        'sparse_direct' - the same linear solve using sparse matrix (scipy)
+        'krylov'        - solve it using BiCGSTAB, an iterative sparse
+                          solver (scipy)
+        'auto'          - the fastest solve method of this grid size and
+                          discount (fastest_evaluation_method)
+
+    with discount=1 the policy must be proper (it reaches a goal state from
+    every state), otherwise (I - discount P_pi) is singular and every linear
+    solve method raises numpy.linalg.LinAlgError (and 'iterative' never stops)
+    """
+    if method == 'auto':
+        method = fastest_evaluation_method(policy, env, discount, epsilon)
+
+    R_pi = policy_reward(policy, env)
+
+    if method == 'iterative':
+        # weight of every next state
+        weight = (policy[:, :, None] * env.prob).reshape(env.nS, -1)
+        next_state = env.next_state.reshape(env.nS, -1)
+
+        V = np.zeros(env.nS)
+        while True:
+            new_V = R_pi + discount * np.sum(weight * V[next_state], axis=1)
+            eror = np.max(np.abs(new_V - V))
+            V = new_V
+
+            if eror < epsilon:
+                break
+
+        return V
+
+    # goal state leaves the problem, so its value is only its reward (0)
+    not_terminal = ~env.is_terminal
+
+    if method == 'direct':
+        P_pi = dense_policy_matrix(policy, env) * not_terminal[:, None]
+        return np.linalg.solve(np.eye(env.nS) - discount * P_pi, R_pi)
+
+    if method in ('sparse_direct', 'krylov'):
+        from scipy import sparse
+        from scipy.sparse import linalg
+
+        P_pi = sparse.diags(not_terminal.astype(float)).dot(
+                    env.policy_matrix(policy))
+        A = (sparse.identity(env.nS) - discount * P_pi).tocsc()
+
+        if method == 'sparse_direct':
+            # spsolve only warns on a singular matrix and returns NaN,
+            # raise the same error as 'direct'
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', linalg.MatrixRankWarning)
+                V = linalg.spsolve(A, R_pi)
+            if not np.all(np.isfinite(V)):
+                raise np.linalg.LinAlgError("Singular matrix")
+            return V
+
+        V, info = linalg.bicgstab(A, R_pi, atol=epsilon)
+        if not np.all(np.isfinite(V)):
+            raise np.linalg.LinAlgError("Singular matrix")
+        if info != 0:
+            raise RuntimeError("krylov solver did not converge: {}".format(info))
+        return V
+
+    raise ValueError("unknown policy evaluation method: {}".format(method))
+
+def bellman_residual(V, policy, env, discount=1):
+    """largest error of V in the Bellman Expected Equation"""
+    new_V = policy_reward(policy, env) + discount * np.sum(
+        policy[:, :, None] * env.prob * V[env.next_state], axis=(1, 2))
+    return np.max(np.abs(new_V - V))
+
+def compare_evaluation_methods(policy, env, discount=1, epsilon=0.00001,
+                               methods=evaluation_methods, verbose=True):
+    """run policy evaluation using every method, print (if verbose) and
+    return the time and the Bellman residual of each method"""
+    result = {}
+    for method in methods:
+        start = time.time()
+        V = policy_evaluation_array(policy, env, discount, epsilon, method)
+        duration = time.time() - start
+        residual = bellman_residual(V, policy, env, discount)
+
+        if verbose:
+            print("{:14s}: {:.4f} s, residual {:.2e}".format(method, duration,
+                                                            residual))
+        result[method] = (duration, residual)
+
+    return result
+
+def fastest_evaluation_method(policy, env, discount=1, epsilon=0.00001):
+    """the solve method (solve_methods) with the smallest time of
+    compare_evaluation_methods on policy, it is timed once for every
+    number of states and discount then kept in fastest_methods
+
+    'iterative' is not timed, it never stops for a policy which is not proper,
+    and 'direct' is not timed with more than max_direct_states states.
+    A method which fails on policy (LinAlgError or RuntimeError) is not
+    chosen, when every method fails the LinAlgError is raised and nothing
+    is kept
+    """
+    key = (env.nS, discount)
+    if key not in fastest_methods:
+        # import scipy before timing, it is not the time of the solver
+        from scipy.sparse import linalg
+
+        durations = {}
+        for method in solve_methods:
+            if method == 'direct' and env.nS > max_direct_states:
+                continue
+            try:
+                result = compare_evaluation_methods(policy, env, discount,
+                                                    epsilon, (method,),
+                                                    verbose=False)
+            except (np.linalg.LinAlgError, RuntimeError):
+                continue
+            durations[method] = result[method][0]
+
+        if not durations:
+            raise np.linalg.LinAlgError("Singular matrix")
+        fastest_methods[key] = min(durations, key=durations.get)
+
+    return fastest_methods[key]
+
+def policy_evaluation_sparse(policy, env, discount=1, epsilon=0.00001):
+    """policy evaluation from Sutton's Book, one sweep is one sparse
+    matrix-vector product V = R_pi + discount * P_pi V
+
+    policy = array [s, a] - probability from state s choosing action a
+    """
+    P_pi = env.policy_matrix(policy)
+    R_pi = env.reward * np.sum(policy, axis=1)
+
+    V = np.zeros(env.nS)
+    while True:
+        new_V = R_pi + discount * P_pi.dot(V)
+        eror = np.max(np.abs(new_V - V))
+        V = new_V
+
+        if eror < epsilon:
+            break
+
+    return V
+
+def value_iteration_array(env, discount=1, epsilon=0.00001):
+    """value iteration from Sutton's Book using env arrays,
+    one sweep updates every state at once"""
+    V = np.zeros(env.nS)
+    while True:
+        # Q value of every state and action
+        Q = np.sum(env.prob * (env.reward[:, None, None] +
+                               discount * V[env.next_state]), axis=2)
+        new_V = np.max(Q, axis=1)
+        eror = np.max(np.abs(new_V - V))
+        V = new_V
+
+        if eror < epsilon:
+            break
+
+    return V
+
+def greedy_policy(V, env, discount=1):
+    """greedy policy of V using env arrays, int array [s] of actions"""
+    Q = np.sum(env.prob * (env.reward[:, None, None] +
+                           discount * V[env.next_state]), axis=2)
+    return np.argmax(Q, axis=1)
+
+def modified_policy_iteration(env, discount=1, k=5, theta=0.00001, policy=None,
+                              max_iterations=10000):
+    """modified policy iteration using env arrays
+
+    Every evaluation starts from V of the previous one and only does k sweeps,
+    then the policy is improved greedily. k=None evaluates the policy exactly
+    (classic policy iteration), if the linear system is singular (an improper
+    policy with discount=1) that evaluation falls back to warm started sweeps.
+
+    policy = int array [s] - action of every state (default all UP, with
+             k=None the greedy policy of the random policy_0, because all UP
+             never reaches a goal from the top row)
+    max_iterations = int - RuntimeError after this many improvements
+    return policy, V and the number of improvements
+    """
+    if policy is None:
+        if k is None:
+            V = policy_evaluation_array(np.full((env.nS, nAction), 0.25), env,
+                                        discount, theta, method='auto')
+            policy = greedy_policy(V, env, discount)
+        else:
+            policy = np.zeros(env.nS, dtype=np.int64)
+    states = np.arange(env.nS)
+    V = np.zeros(env.nS)
+    n_improvements = 0
+
+    while True:
+        # Evaluate policy, warm started from the last V
+        sweeps = k
+        if k is None:
+            try:
+                V = policy_evaluation_array(np.eye(nAction)[policy], env,
+                                            discount, theta, method='auto')
+            except np.linalg.LinAlgError:
+                sweeps = 5
+        if sweeps is not None:
+            next_state = env.next_state[states, policy]
+            prob = env.prob[states, policy]
+            for _ in range(sweeps):
+                V = env.reward + discount * np.sum(prob * V[next_state], axis=1)
+
+        if not np.all(np.isfinite(V)):
+            raise RuntimeError("policy evaluation diverged after {} "
+                               "improvements".format(n_improvements))
+
+        # Improve policy, keep the old action when it is as good as the best
+        Q = np.sum(env.prob * (env.reward[:, None, None] +
+                               discount * V[env.next_state]), axis=2)
+        best = np.max(Q, axis=1)
+        new_policy = np.where(Q[states, policy] >= best - 1e-12,
+                              policy, np.argmax(Q, axis=1))
+        n_improvements += 1
+
+        # If converged
+        if np.array_equal(new_policy, policy) and \
+                np.max(np.abs(best - V)) < theta:
             break
+        if n_improvements >= max_iterations:
+            raise RuntimeError("policy iteration did not converge in {} "
+                               "improvements".format(max_iterations))
+        policy = new_policy
+
+    return policy, V, n_improvements
+
+def benchmark_policy_iteration(sizes=(10, 20, 40, 80), discount=1, k=5):
+    """compare the time of policy iteration, modified policy iteration
+    and value iteration on growing Grid Worlds"""
+    result = {}
+    for n in sizes:
+        env = GridWorld((n, n), terminate=[(0, 0), (n-1, n-1)])
+        times = {}
+
+        # classic policy iteration starts from the greedy policy of policy_0
+        start = time.time()
+        modified_policy_iteration(env, discount, k=None)
+        times['policy iteration'] = time.time() - start
+
+        start = time.time()
+        modified_policy_iteration(env, discount, k=k)
+        times['modified policy iteration'] = time.time() - start
+
+        start = time.time()
+        value_iteration_array(env, discount)
+        times['value iteration'] = time.time() - start
+
+        print("Grid World {}x{}: ".format(n, n) + ", ".join(
+            "{} {:.4f} s".format(name, times[name]) for name in sorted(times)))
+        result[n] = times
+
+    return result
+
+value_iteration_modes = ('synchronous', 'gauss_seidel', 'prioritized')
+
+def value_iteration_async(env, discount=1, theta=0.00001, mode='gauss_seidel',
+                          V=None):
+    """value iteration using env arrays with different backup orders
+
+    mode = str
+        'synchronous'  - every sweep uses V of the previous sweep
+                         (value_iteration_array)
+        'gauss_seidel' - in place, a backup uses the newest V of other
+                         states, the sweeps go forward and backward in turn
+        'prioritized'  - prioritized sweeping, a state is backed up when
+                         the changes of its next states may change it by
+                         more than theta, the biggest first
+    V = array [s] - start values (default the value of the random policy_0,
+        it is below the optimal values so every backup only raises V and
+        a better value is passed on in one sweep, from 0 the values can
+        only fall by one reward per sweep)
+
+    return V and the number of state backups done until every Bellman error
+    (or every change of a sweep) is below theta, the start values are not
+    counted
+    """
+    if mode not in value_iteration_modes:
+        raise ValueError("unknown value iteration mode: {}".format(mode))
+    if V is None:
+        V = policy_evaluation_array(np.full((env.nS, nAction), 1.0 / nAction),
+                                    env, discount, method='auto')
+
+    if mode == 'synchronous':
+        n_backups = 0
+        while True:
+            Q = np.sum(env.prob * (env.reward[:, None, None] +
+                                   discount * V[env.next_state]), axis=2)
+            new_V = np.max(Q, axis=1)
+            n_backups += env.nS
+            eror = np.max(np.abs(new_V - V))
+            V = new_V
+
+            if eror < theta:
+                break
+
+        return V, n_backups
+
+    next_state = env.next_state.tolist()
+    prob = env.prob.tolist()
+    reward = env.reward.tolist()
+    V = V.tolist()
+
+    def backup(s):
+        return max(sum(p * (reward[s] + discount * V[s_new])
+                       for p, s_new in zip(prob[s][a], next_state[s][a]))
+                   for a in range(nAction))
+
+    if mode == 'gauss_seidel':
+        order = list(range(env.nS))
+        n_backups = 0
+        while True:
+            eror = 0
+            for s in order:
+                new_val = backup(s)
+                eror = max(eror, abs(new_val - V[s]))
+                V[s] = new_val
+            n_backups += env.nS
+            order.reverse()
+
+            if eror < theta:
+                break
+
+        return np.array(V), n_backups
+
+    # states which can go to s in one step (s itself too if it can stay)
+    predecessors = [set() for _ in range(env.nS)]
+    for s in range(env.nS):
+        for s_new in env.next_state[s].ravel().tolist():
+            predecessors[s_new].add(s)
+
+    # pending[s] - how much the backup of s may have changed since it was
+    # done last time, a change of V[s] changes the backup of a predecessor
+    # by at most discount times it, version[s] - number of the newest heap
+    # entry of s, older entries are skipped
+    pending = [0.0] * env.nS
+    version = [0] * env.nS
+    queue = []
+
+    # the first backups are kept with their heap entry, they are still right
+    # when the entry is popped unless a newer entry of the state was pushed
+    for s in range(env.nS):
+        new_val = backup(s)
+        pending[s] = abs(new_val - V[s])
+        if pending[s] > theta:
+            heapq.heappush(queue, (-pending[s], s, 0, new_val))
+    n_backups = env.nS
+
+    while queue:
+        _, s, v, new_val = heapq.heappop(queue)
+        if v != version[s]:
+            continue
+        if new_val is None:
+            new_val = backup(s)
+            n_backups += 1
+        change = abs(new_val - V[s])
+        V[s] = new_val
+        pending[s] = 0.0
+        version[s] += 1
+
+        for s_pred in predecessors[s]:
+            pending[s_pred] += discount * change
+            if pending[s_pred] > theta:
+                version[s_pred] += 1
+                heapq.heappush(queue, (-pending[s_pred], s_pred,
+                                       version[s_pred], None))
+
+    return np.array(V), n_backups
+
+def compare_value_iteration_modes(env, discount=1, theta=0.00001,
+                                  modes=value_iteration_modes):
+    """run value iteration using every mode, print and return the number of
+    backups and the time of each mode"""
+    result = {}
+    for mode in modes:
+        start = time.time()
+        V, n_backups = value_iteration_async(env, discount, theta, mode)
+        duration = time.time() - start
+
+        print("{:12s}: {} backups, {:.4f} s".format(mode, n_backups, duration))
+        result[mode] = (n_backups, duration)
+
+    return result
+
+def benchmark_sparse(shape=(1000, 1000), discount=0.9):
+    """build a large sparse Grid World and evaluate the random policy_0 on it,
+    print the time and memory of each part"""
+    start = time.time()
+    env = GridWorld(shape, terminate=[(0, 0), (shape[0]-1, shape[1]-1)],
+                    sparse=True)
+    P = env.sparse_matrix()
+    build_time = time.time() - start
+
+    policy = np.full((env.nS, nAction), 1.0 / nAction)
+    start = time.time()
+    V = policy_evaluation_sparse(policy, env, discount)
+    eval_time = time.time() - start
+
+    memory = (P.data.nbytes + P.indices.nbytes + P.indptr.nbytes +
+              env.next_state.nbytes + env.prob.nbytes)
+    print("Grid World {}: {} states".format(shape, env.nS))
+    print("build : {:.2f} s, {:.1f} MB".format(build_time, memory / 1e6))
+    print("policy evaluation : {:.2f} s".format(eval_time))
 
     return V
 
@@ -226,8 +772,8 @@ if __name__ == "__main__":
     # Create policy
     policy = policy_0()
 
-    print "Initial Policy"
-    print policy_to_array(policy)
+    print("Initial Policy")
+    print(policy_to_array(policy))
 
     # create environment
     env = GridWorld(terminate=[(0, 0), (3, 3)])
@@ -240,7 +786,7 @@ if __name__ == "__main__":
 #    final_value = value_iteration(env)
 #    final_policy = value_to_policy(final_value)
 
-    print "Value Result"
-    print value_to_array(final_value)
-    print "Policy Result"
-    print policy_to_array(final_policy)
+    print("Value Result")
+    print(value_to_array(final_value))
+    print("Policy Result")
+    print(policy_to_array(final_policy))
@@ -1,52 +1,119 @@
+import numpy as np
+
+from lib.buffers import IntegerBuffer
+from lib.tabular import StateEncoder
+
 UP = 0
 LEFT = 1
 DOWN = 2
 RIGHT = 3
+UP_LEFT = 4
+UP_RIGHT = 5
+DOWN_LEFT = 6
+DOWN_RIGHT = 7
+
+# (row, col) change of every action
+moves = {UP: (-1, 0), LEFT: (0, -1), DOWN: (1, 0), RIGHT: (0, 1),
+         UP_LEFT: (-1, -1), UP_RIGHT: (-1, 1),
+         DOWN_LEFT: (1, -1), DOWN_RIGHT: (1, 1)}
 
 class WindyGridWorld(object):
     """Create an environment of a Grid World
     R = dict {(s):reward} - reward matrix, reward which obtained on state s
+
+    king_moves = bool - if True there are 8 actions, the diagonal moves too
+    stochastic_wind = bool - if True the wind of a windy column is sometimes
+                      one more or one less than its value (each 1/3 chance)
+    seed = int, SeedSequence or Generator - seed of the stochastic wind
+
+    Every (state, action, wind noise) result is computed once in
+    build_table(), state (row, col) has index row * n_col + col, the wind
+    noise index is 0 if the wind is not stochastic, otherwise 0, 1, 2 for
+    one less, the same, one more:
+    next_state = int array [s, a, noise] - state after taking action a on s
+    reward = float array [s, a, noise] - reward of taking action a on s
+    done = bool array [s, a, noise] - True if it reaches the goal
+
+    act() = PARAMS : action
+            RETURN : (state), done_status, reward
+
+    step() = PARAMS : array of state index, array of action
+             RETURN : array of next state index, reward, done_status
     """
 
     def __init__(self, shape=(7, 10),  start=(3, 0), terminate=(3, 7),
-                    wind=[0, 0, 0, 1, 1, 1, 2, 2, 1, 0]):
+                    wind=[0, 0, 0, 1, 1, 1, 2, 2, 1, 0],
+                    king_moves=False, stochastic_wind=False, seed=None):
         self.shape = shape
         self.R = {}
         self.terminate = terminate
         self.start = start
-        self.now = start
         self.wind = wind
+        self.king_moves = king_moves
+        self.stochastic_wind = stochastic_wind
+        self.nAction = 8 if king_moves else 4
 
-        for i in xrange(self.shape[0]):
-            for j in xrange(self.shape[1]):
+        # wind noise is drawn from a pre-sampled buffer
+        self.noise = IntegerBuffer(3, seed) if stochastic_wind else None
+
+        for i in range(self.shape[0]):
+            for j in range(self.shape[1]):
                 self.R[(i, j)] = 0 if (i, j)==self.terminate else -1.0
-                       
+
+        self.build_table()
+        self.reset()
+
+    def build_table(self):
+        n_row, n_col = self.shape
+        self.nS = n_row * n_col
+        i, j = np.divmod(np.arange(self.nS), n_col)
+        wind = np.asarray(self.wind)
+        noises = [-1, 0, 1] if self.stochastic_wind else [0]
+
+        self.next_state = np.empty((self.nS, self.nAction, len(noises)),
+                                   dtype=np.int64)
+        for a in range(self.nAction):
+            d_row, d_col = moves[a]
+            next_i = np.clip(i + d_row, 0, n_row - 1)
+            next_j = np.clip(j + d_col, 0, n_col - 1)
+
+            for k, noise in enumerate(noises):
+                # the wind of the arrival column pushes up,
+                # only a windy column has the noise
+                push = wind[next_j] + np.where(wind[next_j] != 0, noise, 0)
+                wind_i = np.clip(next_i - push, 0, n_row - 1)
+                self.next_state[:, a, k] = wind_i * n_col + next_j
+
+        goal = self.terminate[0] * n_col + self.terminate[1]
+        self.done = self.next_state == goal
+        self.reward = np.where(self.done, 0.0, -1.0)
+
+        self.states = [(s // n_col, s % n_col) for s in range(self.nS)]
+        self._next_state = self.next_state.tolist()
+        self._done = self.done.tolist()
+        self._reward = self.reward.tolist()
+
     def state(self):
-        return self.now
-    
+        return self.states[self.now]
+
+    def encoder(self):
+        return StateEncoder([range(self.shape[0]), range(self.shape[1])])
+
     def reset(self):
-        self.now = (3, 0)
+        self.now = self.start[0] * self.shape[1] + self.start[1]
 
     def act(self, action):
-        if action==UP:
-            self.act_up()
-        if action==RIGHT:
-            self.act_right()
-        if action==LEFT:
-            self.act_left()
-        if action==DOWN:
-            self.act_down()
-        self.act_up(step=self.wind[self.now[1]])
-        return (self.state(), self.state()==self.terminate, self.R[self.state()])
-
-    def act_up(self, step=1):
-        self.now = (max(self.now[0]-step, 0), self.now[1])
-
-    def act_down(self, step=1):
-        self.now = (min(self.now[0]+step, self.shape[0]-1), self.now[1])
-
-    def act_right(self, step=1):
-        self.now = (self.now[0], min(self.now[1]+step, self.shape[1]-1))
-
-    def act_left(self, step=1):
-        self.now = (self.now[0], max(self.now[1]-step, 0))
+        s = self.now
+        k = self.noise.draw() if self.stochastic_wind else 0
+        self.now = self._next_state[s][action][k]
+        return self.states[self.now], self._done[s][action][k], \
+                    self._reward[s][action][k]
+
+    def step(self, states, actions):
+        """move many agents at once, states are state index"""
+        if self.stochastic_wind:
+            k = self.noise.draw_many(len(states))
+        else:
+            k = 0
+        return (self.next_state[states, actions, k],
+                self.reward[states, actions, k], self.done[states, actions, k])
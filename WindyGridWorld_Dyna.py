@@ -0,0 +1,188 @@
+import numpy as np
+
+from collections import deque
+from WindyGridWorld import WindyGridWorld
+from lib import plotting
+from lib.policy import EpsilonGreedyPolicy
+from lib.tabular import TabularValueStore
+
+env = WindyGridWorld()
+
+class ArrayModel(object):
+    """Learned model of a deterministic environment, (s, a) -> (s', r, done)
+    of the last time action a was taken on state s
+
+    Every array is preallocated [n_states, n_actions], the visited pairs are
+    kept in pairs (only the first n_pairs items) so a planning sample is
+    one random index of pairs.
+
+    next_state = int array - state after (s, a), -1 if never tried
+    reward = float array - reward of (s, a)
+    done = bool array - True if (s, a) ends the episode
+    last_step = int array - real step when (s, a) was tried last time
+    """
+    def __init__(self, n_states, n_actions):
+        self.n_actions = n_actions
+        self.next_state = np.full((n_states, n_actions), -1, dtype=np.int64)
+        self.reward = np.zeros((n_states, n_actions))
+        self.done = np.zeros((n_states, n_actions), dtype=bool)
+        self.last_step = np.zeros((n_states, n_actions), dtype=np.int64)
+        self.pairs = np.zeros(n_states * n_actions, dtype=np.int64)
+        self.n_pairs = 0
+
+    def update(self, s, a, s_new, r, done, step):
+        if self.next_state[s, a] < 0:
+            self.pairs[self.n_pairs] = s * self.n_actions + a
+            self.n_pairs += 1
+        self.next_state[s, a] = s_new
+        self.reward[s, a] = r
+        self.done[s, a] = done
+        self.last_step[s, a] = step
+
+    def sample(self, rng, k):
+        """k random visited pairs, return array of s and array of a"""
+        pair = self.pairs[rng.integers(self.n_pairs, size=k)]
+        return np.divmod(pair, self.n_actions)
+
+def dyna_q(n_episodes, planning_steps=10, alfa=0.5, epsilon=0.1, discount=1.0,
+           kappa=0.0, env=env, seed=None, stop=None):
+    """Dyna-Q (kappa = 0) and Dyna-Q+ (kappa > 0), Sutton's book section 8.2
+
+    Every real step does a Q-learning update, saves the step in the model,
+    then does planning_steps Q-learning updates on (s, a) pairs sampled from
+    the model. The planning pairs of a step are drawn at once, Dyna-Q+ adds
+    kappa * sqrt(steps since (s, a) was tried) to their reward.
+
+    stop = function - stop(Q) is called after every episode, it stops
+           learning if it returns True
+    seed = int, SeedSequence or Generator - seed of action choosing and
+           planning samples
+
+    return Q, EpisodeStats (episode_lengths is the number of real steps)
+    """
+    encoder = env.encoder()
+    index = encoder.index
+    n_actions = env.nAction
+    Q = TabularValueStore(encoder, n_actions=n_actions)
+    table = Q.table
+    model = ArrayModel(encoder.n_states, n_actions)
+    rng = np.random.default_rng(seed)
+    sampler = EpsilonGreedyPolicy(epsilon, n_actions, rng)
+
+    stats = plotting.EpisodeStats(
+        episode_lengths=np.zeros(n_episodes),
+        episode_rewards=np.zeros(n_episodes))
+
+    step = 0
+    for e in range(n_episodes):
+        env.reset()
+        s = index[env.state()]
+        done = False
+
+        while not done:
+            # Real step and direct Q-learning update
+            Q.visited[s] = True
+            a = sampler.sample(table[s])
+            next_state, done, reward = env.act(a)
+            s_new = index[next_state]
+            step += 1
+
+            target = reward if done else reward + discount * table[s_new].max()
+            table[s, a] += alfa * (target - table[s, a])
+            model.update(s, a, s_new, reward, done, step)
+
+            stats.episode_rewards[e] += reward
+            stats.episode_lengths[e] += 1
+
+            # Planning, every sample is one Q-learning update
+            if planning_steps > 0:
+                ps, pa = model.sample(rng, planning_steps)
+                pr = model.reward[ps, pa]
+                if kappa > 0:
+                    pr = pr + kappa * np.sqrt(step - model.last_step[ps, pa])
+                pnext = model.next_state[ps, pa].tolist()
+                pdone = model.done[ps, pa].tolist()
+                pr = pr.tolist()
+
+                for ss, aa, i in zip(ps.tolist(), pa.tolist(),
+                                     range(planning_steps)):
+                    target = pr[i] if pdone[i] else \
+                             pr[i] + discount * table[pnext[i]].max()
+                    table[ss, aa] += alfa * (target - table[ss, aa])
+
+            s = s_new
+
+        if stop is not None and stop(Q):
+            return Q, plotting.EpisodeStats(
+                episode_lengths=stats.episode_lengths[:e + 1],
+                episode_rewards=stats.episode_rewards[:e + 1])
+
+    return Q, stats
+
+def shortest_path_length(env=env):
+    """number of steps of the optimal path from start to goal (breadth
+    first search on the deterministic wind table)"""
+    start = env.start[0] * env.shape[1] + env.start[1]
+    steps = {start: 0}
+    queue = deque([start])
+    while queue:
+        s = queue.popleft()
+        for a in range(env.nAction):
+            s_new = env.next_state[s, a, 0]
+            if env.done[s, a, 0]:
+                return steps[s] + 1
+            if s_new not in steps:
+                steps[s_new] = steps[s] + 1
+                queue.append(s_new)
+    return None
+
+def greedy_path_length(Q, env=env, max_steps=1000):
+    """number of steps of the greedy path of Q from start to goal, None if
+    it does not reach the goal, it uses the wind table (not real steps)"""
+    s = env.start[0] * env.shape[1] + env.start[1]
+    for t in range(max_steps):
+        a = int(Q.table[s].argmax())
+        if env.done[s, a, 0]:
+            return t + 1
+        s = env.next_state[s, a, 0]
+    return None
+
+def real_steps_to_optimal(planning_steps=10, kappa=0.0, max_episodes=1000,
+                          env=env, seed=None, **kwargs):
+    """number of real steps Dyna-Q needs until its greedy path is optimal,
+    None if it is not optimal after max_episodes"""
+    optimal = shortest_path_length(env)
+    Q, stats = dyna_q(max_episodes, planning_steps, kappa=kappa, env=env,
+                      seed=seed,
+                      stop=lambda Q: greedy_path_length(Q, env) == optimal,
+                      **kwargs)
+    if greedy_path_length(Q, env) != optimal:
+        return None
+    return int(stats.episode_lengths.sum())
+
+def benchmark_dyna(planning_steps=(0, 5, 10, 50), kappa=0.0, n_seeds=5):
+    """mean real steps to the optimal path for every planning_steps,
+    planning_steps = 0 is plain Q-learning"""
+    for k in planning_steps:
+        steps = [real_steps_to_optimal(k, kappa, seed=seed)
+                 for seed in range(n_seeds)]
+        reached = [x for x in steps if x is not None]
+        print("planning steps: {:>3} | real steps: {:>8.0f} | "
+              "reached: {}/{}".format(k, np.mean(reached) if reached else
+                                      np.nan, len(reached), n_seeds))
+
+
+if __name__ == "__main__":
+
+    """Block code below optimize Q with Dyna-Q then simulate it
+    """
+    print("DYNA-Q OPTIMIZE THE POLICY AND Q-VALUE")
+
+    Q, stats = dyna_q(n_episodes=100, planning_steps=10)
+    plotting.plot_episode_stats(stats)
+
+    print("Greedy path length: {} (optimal {})".format(
+                greedy_path_length(Q), shortest_path_length()))
+
+    print("REAL STEPS TO THE OPTIMAL PATH")
+    benchmark_dyna()
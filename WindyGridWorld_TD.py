@@ -1,97 +1,161 @@
 import numpy as np
-import itertools
 
-from collections import defaultdict
 from WindyGridWorld import WindyGridWorld
-from lib import plotting
+from lib import plotting, td
+from lib.policy import EpsilonGreedyPolicy
 
 env = WindyGridWorld()
 
-def policy_epsilon(Q, epsilon, state):
-    """Policy-epsilon :
+def policy_epsilon(Q, sampler, state):
+    """Policy-epsilon, sampler (lib.policy.EpsilonGreedyPolicy) choose:
 	   - epsilon probability choosing random action
 		- 1-epsilon probability choosing action wich has maximum Q value
     """
-    if np.random.rand() <= epsilon:
-        # Explore
-        return np.array([.25, .25, .25, .25])
-    else:
-        # Exploit
-        best_action = np.argmax(Q[state])
-        A = np.zeros(4)
-        A[best_action] = 1
-        return A
+    return sampler.sample(Q[state])
 
 
 # td_control a.k.a SARSA
-def td_control(policy, n_episodes, alfa=0.5, epsilon=0.1, discount=1.0, env=env):
+def td_control(policy, n_episodes, alfa=0.5, epsilon=0.1, discount=1.0, env=env,
+               recorder=None, seed=None, backend='auto'):
+    """SARSA with policy(Q, sampler, state), e.g policy_epsilon, it runs
+    lib.td.td_control
+
+    seed = int, SeedSequence or Generator - seed of action choosing
+    recorder = lib.replay.EpisodeRecorder - every step is recorded if given
+    backend = str - 'auto', 'jit' or 'python' (lib.jit.backends), the
+              kernel only runs policy_epsilon without a recorder, it gives
+              the same Q and stats as the Python learner
+
+    return Q, EpisodeStats (episode_lengths is the number of steps)
+    """
+    if backend != 'python':
+        from lib import jit
+        if jit.use_kernel(backend, policy is policy_epsilon and
+                          recorder is None):
+            Q, lengths, rewards = jit.windy_td_control(
+                env, n_episodes, alfa, epsilon, discount, seed)
+            return Q, plotting.EpisodeStats(episode_lengths=lengths,
+                                            episode_rewards=rewards)
+
+    return td.td_control(env, n_episodes, 'sarsa', 1, alfa, epsilon, discount,
+                         seed, recorder, policy)
+
+def hyperparameter_grid(alfas, epsilons, n_seeds=1):
+    """alfa and epsilon of every agent to run all combinations
+    (n_seeds agents each) in one batch_td_control"""
+    alfa, epsilon, _ = np.meshgrid(alfas, epsilons, np.arange(n_seeds),
+                                   indexing='ij')
+    return alfa.ravel(), epsilon.ravel()
+
+# batch_td_control a.k.a SARSA for many agents at once
+def batch_td_control(n_agents, n_episodes, alfa=0.5, epsilon=0.1, discount=1.0,
+                     env=env, seed=None):
+    """run n_agents independent SARSA agents at once on the same environment
+
+    Every step moves all agents together using env.step, Q of all agents is
+    one array [agent, row, col, action], an agent which finishes an episode
+    starts a new one while the others keep going, an agent which finishes
+    n_episodes stops (it takes no more steps and draws no more actions).
+    With one agent it gives the same Q and stats as td_control for the
+    same seed (episode_lengths is the number of steps).
+
+    alfa, epsilon = float or array [n_agents] - e.g from hyperparameter_grid
+    seed = int, SeedSequence or Generator - seed of action choosing
+    """
+    n_actions = env.nAction
+    agents = np.arange(n_agents)
+    alfa = np.broadcast_to(np.asarray(alfa, dtype=float), (n_agents,))
+    epsilon = np.broadcast_to(np.asarray(epsilon, dtype=float), (n_agents,))
+
+    # Make a value table with deafult value 0.0
+    Q = np.zeros((n_agents, env.nS, n_actions))
 
-    # Make a dictionary with deafult value 0.0
-    Q = defaultdict(lambda: np.zeros(4))
-    
-    # for Denny Britz's plotting
-    # Keeps track of useful statistics
     stats = plotting.EpisodeStats(
-        episode_lengths=np.zeros(n_episodes),
-        episode_rewards=np.zeros(n_episodes))
-
-    for e in xrange(n_episodes):
-        print "\rEpisode " + str(e + 1)
-        
-        env.reset()
-        now_state = env.state()
-        
-        # Chosen action
-        act_prob = policy(Q, epsilon, now_state)
-        action = np.random.choice(np.arange(len(act_prob)), p=act_prob)
-
-        # Generate one episode
-        for t in itertools.count():
-            
-            # Take action
-            next_state, done, reward = env.act(action)
-            
-            # Update statistics
-            stats.episode_rewards[e] += reward
-            stats.episode_lengths[e] = t
-
-            # Get next action
-            next_act_prob = policy(Q, epsilon, next_state)
-            next_action = np.random.choice(np.arange(len(next_act_prob)),
-                                                           p=next_act_prob)
-
-            # Not waiting to generate one episode for TD update
-            td_target = reward + discount * Q[next_state][next_action]
-            td_delta = td_target - Q[now_state][action]
-            Q[now_state][action] += alfa * td_delta
-
-            if done:
-                break
-            
-            # Move to the next state
-            now_state = next_state
-            action = next_action
-
-    return Q, stats
-
-"""Block code below optimize Q and policy then simulate it
-"""
-print "TEMPORAL-DIFFERENCE CONTROL A.K.A SARSA OPTIMIZE THE POLICY AND Q-VALUE"
-
-Q, stats = td_control(policy_epsilon, n_episodes=200)
-plotting.plot_episode_stats(stats)
-
-print "SIMULATE THE OPTIMIZED POLICY AND Q-VALUE"
-
-env.reset()
-state = env.state()
-done = False
-step = 0
-while not done:
-    step += 1
-    action = np.argmax(Q[state])
-    next_state, done, reward = env.act(action)
-    print "action: "+str(action)
-    state = next_state
-    print state
-print "Total Step: "+str(step)
\ No newline at end of file
+        episode_lengths=np.zeros((n_agents, n_episodes)),
+        episode_rewards=np.zeros((n_agents, n_episodes)))
+
+    sampler = EpsilonGreedyPolicy(epsilon, n_actions, seed)
+
+    def policy_epsilon(idx, state):
+        # epsilon-greedy action of the agents idx at once
+        sampler.epsilon = epsilon[idx]
+        return sampler.sample_many(Q[idx, state])
+
+    start = env.start[0] * env.shape[1] + env.start[1]
+    now_state = np.full(n_agents, start)
+    action = policy_epsilon(agents, now_state)
+    episode = np.zeros(n_agents, dtype=np.int64)
+    t = np.zeros(n_agents, dtype=np.int64)
+
+    # only agents which have not finished n_episodes step and draw actions
+    running = agents
+    while len(running):
+        s = now_state[running]
+        a = action[running]
+
+        # Take action
+        next_state, reward, done = env.step(s, a)
+
+        # Update statistics, episode_lengths is the number of steps
+        t[running] += 1
+        e = episode[running]
+        stats.episode_rewards[running, e] += reward
+        stats.episode_lengths[running, e] = t[running]
+
+        # Agents which are done start again, if they have episodes left
+        episode[running] += done
+        t[running[done]] = 0
+        new_state = np.where(done, start, next_state)
+        keep = episode[running] < n_episodes
+
+        # Get next action
+        next_action = np.zeros(len(running), dtype=np.int64)
+        next_action[keep] = policy_epsilon(running[keep], new_state[keep])
+
+        # Not waiting to generate one episode for TD update
+        td_target = reward + np.where(
+            done, 0.0, discount * Q[running, next_state, next_action])
+        td_delta = td_target - Q[running, s, a]
+        Q[running, s, a] += alfa[running] * td_delta
+
+        # Move to the next state
+        now_state[running] = new_state
+        action[running] = next_action
+        running = running[keep]
+
+    return Q.reshape((n_agents,) + tuple(env.shape) + (n_actions,)), stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="SARSA on Windy Grid World")
+    parser.add_argument("--n-episodes", type=int, default=200,
+                        help="number of episodes")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed of the policy")
+    args = parser.parse_args()
+
+    """Block code below optimize Q and policy then simulate it
+    """
+    print("TEMPORAL-DIFFERENCE CONTROL A.K.A SARSA OPTIMIZE THE POLICY AND Q-VALUE")
+
+    Q, stats = td_control(policy_epsilon, n_episodes=args.n_episodes,
+                          seed=args.seed)
+    plotting.plot_episode_stats(stats)
+
+    print("SIMULATE THE OPTIMIZED POLICY AND Q-VALUE")
+
+    env.reset()
+    state = env.state()
+    done = False
+    step = 0
+    while not done:
+        step += 1
+        action = np.argmax(Q[state])
+        next_state, done, reward = env.act(action)
+        print("action: "+str(action))
+        state = next_state
+        print(state)
+    print("Total Step: "+str(step))
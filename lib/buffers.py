@@ -0,0 +1,70 @@
+import numpy as np
+
+
+class RandomBuffer(object):
+    """Create a seeded stream of random numbers
+
+    Numbers are generated block by block, one Generator call makes
+    block_size of them, then they are handed out one by one and a new block
+    is made only when the old one is used up. draw() hands items out of a
+    python list copy of the block, indexing one item of a list is much
+    faster than indexing one item of an array.
+
+    generate = function (rng, size) - makes one block of size items
+    seed = int, SeedSequence or Generator - seed of the stream
+    block_size = int - number of items generated at once
+
+    draw() = PARAMS : None
+             RETURN : one item
+
+    draw_many() = PARAMS : n - number of items
+                  RETURN : array of n items
+    """
+    def __init__(self, generate, seed=None, block_size=65536):
+        self.generate = generate
+        self.rng = np.random.default_rng(seed)
+        self.block_size = block_size
+        self.refill()
+
+    def refill(self):
+        self.block = self.generate(self.rng, self.block_size)
+        self.items = self.block.tolist()
+        self.pos = 0
+
+    def draw(self):
+        if self.pos == self.block_size:
+            self.refill()
+        item = self.items[self.pos]
+        self.pos += 1
+        return item
+
+    def draw_many(self, n):
+        out = np.empty(n, dtype=self.block.dtype)
+        filled = 0
+        while filled < n:
+            if self.pos == self.block_size:
+                self.refill()
+            take = min(n - filled, self.block_size - self.pos)
+            out[filled:filled + take] = self.block[self.pos:self.pos + take]
+            self.pos += take
+            filled += take
+        return out
+
+
+class IntegerBuffer(RandomBuffer):
+    """Seeded stream of random integers in [0, high), see RandomBuffer"""
+    def __init__(self, high, seed=None, block_size=65536):
+        self.high = high
+        super(IntegerBuffer, self).__init__(self.integers, seed, block_size)
+
+    def integers(self, rng, size): # one block of integers
+        return rng.integers(self.high, size=size)
+
+
+class UniformBuffer(RandomBuffer):
+    """Seeded stream of random floats in [0, 1), see RandomBuffer"""
+    def __init__(self, seed=None, block_size=65536):
+        super(UniformBuffer, self).__init__(self.floats, seed, block_size)
+
+    def floats(self, rng, size): # one block of floats
+        return rng.random(size)
@@ -0,0 +1,413 @@
+import numpy as np
+
+from lib.buffers import UniformBuffer
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+HAVE_NUMBA = numba is not None
+
+# backend of the learners which have a kernel: 'auto' runs the compiled
+# kernel when Numba is installed and the options are supported by it,
+# otherwise the Python learner, 'jit' always runs the kernel, 'python'
+# never does
+backends = ('auto', 'jit', 'python')
+
+# Compiled episode kernels (Numba is optional)
+#
+# Every kernel runs whole episodes, environment dynamics included, over
+# integer state arrays. The random numbers are the same streams the Python
+# learner uses: cards (or wind noise) are drawn block by block from the
+# env's own buffer, action uniforms from a UniformBuffer of seed like the
+# one inside the learner's sampler. So the compiled kernel, the same kernel
+# run as plain Python (kernel.py_func) and the Python learner give the same
+# table for the same env and seed. Without Numba every kernel is plain
+# Python.
+#
+# A kernel stops when a block may not be enough for the next episode (or
+# step), the unused rest is kept in front of the next block. The env and
+# seed streams are therefore left further on than after the Python learner.
+
+# BlackJack state (player score, dealer score, usable ace) has index
+# (player * 32 + dealer) * 2 + ace, the same as BlackJack.encoder()
+BLACKJACK_STATES = 32 * 32 * 2
+
+# cards and uniforms needed for the longest BlackJack episode, an episode
+# only starts if this many of both are left, block_size can not be smaller
+BLACKJACK_DRAWS = 64
+
+
+def jit(func):
+    """numba.njit(func) if Numba is installed, otherwise func itself,
+    func is always kept in .py_func"""
+    if HAVE_NUMBA:
+        return numba.njit(cache=True)(func)
+    func.py_func = func
+    return func
+
+def use_kernel(backend, supported=True):
+    """True if a learner should run its kernel
+
+    supported = bool - False if the learner is called with options the
+                kernel does not have (e.g a recorder)
+    """
+    if backend not in backends:
+        raise ValueError("unknown backend: {}".format(backend))
+    if backend == 'python':
+        return False
+    if backend == 'jit':
+        if not HAVE_NUMBA:
+            raise ImportError("backend 'jit' needs numba")
+        if not supported:
+            raise ValueError("these options are not supported by the "
+                             "'jit' backend")
+        return True
+    return HAVE_NUMBA and supported
+
+
+@jit
+def _score(hard, ace):
+    return hard + 10 if ace and hard + 10 <= 21 else hard
+
+@jit
+def _blackjack_index(player_hard, player_ace, dealer_hard, dealer_ace):
+    ace = 1 if player_ace and player_hard + 10 <= 21 else 0
+    return (_score(player_hard, player_ace) * 32 +
+            _score(dealer_hard, dealer_ace)) * 2 + ace
+
+@jit
+def _blackjack_episode(policy, cards, c, u, p, states, rewards):
+    """play one BlackJack episode, policy [s, action] is the probability
+    of every action, c and p are the positions in cards and u, return
+    number of steps and new c and p"""
+    dealer_hard = cards[c]
+    dealer_ace = dealer_hard == 1
+    player_hard = cards[c + 1]
+    player_ace = player_hard == 1
+    player_ncard = 1
+    c += 2
+
+    n = 0
+    while True:
+        s = _blackjack_index(player_hard, player_ace, dealer_hard, dealer_ace)
+        states[n] = s
+        hit = u[p] >= policy[s, 0]
+        p += 1
+
+        if hit:
+            card = cards[c]
+            c += 1
+            player_hard += card
+            player_ace = player_ace or card == 1
+            player_ncard += 1
+            if player_hard > 21:
+                rewards[n] = -1.0
+                return n + 1, c, p
+            rewards[n] = 0.0
+            n += 1
+            continue
+
+        rewards[n], c = _stick(cards, c, player_hard, player_ace,
+                               player_ncard, dealer_hard, dealer_ace)
+        return n + 1, c, p
+
+@jit
+def _stick(cards, c, player_hard, player_ace, player_ncard, dealer_hard,
+           dealer_ace):
+    """dealer plays after the player sticks, return reward and new c"""
+
+    # Dealer doing hit while his score below 17
+    dealer_ncard = 1
+    while _score(dealer_hard, dealer_ace) < 17:
+        card = cards[c]
+        c += 1
+        dealer_hard += card
+        dealer_ace = dealer_ace or card == 1
+        dealer_ncard += 1
+
+    player_score = _score(player_hard, player_ace)
+    dealer_score = _score(dealer_hard, dealer_ace)
+    if dealer_score > 21:
+        dealer_score = -1
+    player_natural = player_ncard == 2 and player_ace and player_hard == 11
+    dealer_natural = dealer_ncard == 2 and dealer_ace and dealer_hard == 11
+
+    if player_natural and dealer_natural:
+        return 1.0, c
+    if player_natural:
+        return 1.5, c
+    if dealer_score > player_score:
+        return -1.0, c
+    if dealer_score < player_score:
+        return 1.0, c
+    return 0.0, c
+
+@jit
+def blackjack_mc_kernel(cards, u, n_episodes, policy, V, counter, discount):
+    """Every-Visit Monte-carlo prediction (a BlackJack state never repeats
+    in an episode, so it is First-Visit too), return episodes done and the
+    positions in cards and u"""
+    states = np.zeros(BLACKJACK_DRAWS, dtype=np.int64)
+    rewards = np.zeros(BLACKJACK_DRAWS)
+    c = 0
+    p = 0
+    for e in range(n_episodes):
+        if len(cards) - c < BLACKJACK_DRAWS or len(u) - p < BLACKJACK_DRAWS:
+            return e, c, p
+        n, c, p = _blackjack_episode(policy, cards, c, u, p, states, rewards)
+        G = 0.0
+        for t in range(n - 1, -1, -1):
+            G = rewards[t] + discount * G
+            s = states[t]
+            counter[s] += 1
+            V[s] += (G - V[s]) / counter[s]
+    return n_episodes, c, p
+
+@jit
+def blackjack_td_kernel(cards, u, n_episodes, policy, V, counter, alfa,
+                        discount, lmbd, threshold):
+    """TD(lambda) prediction with accumulating traces (lmbd = 0 is TD(0)),
+    a trace below threshold is dropped like lib.traces.EligibilityTraces,
+    the value after the last step is 0, return episodes done and the
+    positions in cards and u"""
+    states = np.zeros(BLACKJACK_DRAWS, dtype=np.int64)
+    rewards = np.zeros(BLACKJACK_DRAWS)
+    z = np.zeros(BLACKJACK_DRAWS)
+    c = 0
+    p = 0
+    for e in range(n_episodes):
+        if len(cards) - c < BLACKJACK_DRAWS or len(u) - p < BLACKJACK_DRAWS:
+            return e, c, p
+        n, c, p = _blackjack_episode(policy, cards, c, u, p, states, rewards)
+
+        # traces of the steps of this episode, a state is never repeated
+        for t in range(n):
+            s = states[t]
+            counter[s] += 1
+            next_value = V[states[t + 1]] if t + 1 < n else 0.0
+            delta = rewards[t] + discount * next_value - V[s]
+            z[t] = 1.0
+            for j in range(t + 1):
+                if z[j] > 0.0:
+                    V[states[j]] += alfa * delta * z[j]
+                    z[j] *= discount * lmbd
+                    if z[j] < threshold:
+                        z[j] = 0.0
+    return n_episodes, c, p
+
+@jit
+def _epsilon_greedy(Q, s, u, epsilon):
+    # same rule as lib.policy.EpsilonGreedyPolicy, one uniform number
+    n_actions = Q.shape[1]
+    if u < epsilon:
+        return min(int(u / epsilon * n_actions), n_actions - 1)
+    return np.argmax(Q[s])
+
+@jit
+def _blackjack_action(Q, s, player_hard, player_ace, u, p, epsilon):
+    # same rule as BlackJack_TD.policy_epsilon, always hit below 12
+    if _score(player_hard, player_ace) < 12:
+        return 1, p
+    return _epsilon_greedy(Q, s, u[p], epsilon), p + 1
+
+@jit
+def blackjack_sarsa_kernel(cards, u, n_episodes, Q, visited, alfa, epsilon,
+                           discount):
+    """SARSA with the policy_epsilon of BlackJack_TD, the value after the
+    last step is 0, return episodes done and the positions in cards and u"""
+    c = 0
+    p = 0
+    for e in range(n_episodes):
+        if len(cards) - c < BLACKJACK_DRAWS or len(u) - p < BLACKJACK_DRAWS:
+            return e, c, p
+        dealer_hard = cards[c]
+        dealer_ace = dealer_hard == 1
+        player_hard = cards[c + 1]
+        player_ace = player_hard == 1
+        player_ncard = 1
+        c += 2
+
+        s = _blackjack_index(player_hard, player_ace, dealer_hard, dealer_ace)
+        a, p = _blackjack_action(Q, s, player_hard, player_ace, u, p, epsilon)
+        while True:
+            visited[s] = True
+            if a == 0:
+                r, c = _stick(cards, c, player_hard, player_ace,
+                              player_ncard, dealer_hard, dealer_ace)
+                Q[s, a] += alfa * (r - Q[s, a])
+                break
+
+            card = cards[c]
+            c += 1
+            player_hard += card
+            player_ace = player_ace or card == 1
+            player_ncard += 1
+            if player_hard > 21:
+                Q[s, a] += alfa * (-1.0 - Q[s, a])
+                break
+
+            s_new = _blackjack_index(player_hard, player_ace, dealer_hard,
+                                     dealer_ace)
+            a_new, p = _blackjack_action(Q, s_new, player_hard, player_ace,
+                                         u, p, epsilon)
+            Q[s, a] += alfa * (0.0 + discount * Q[s_new, a_new] - Q[s, a])
+            s = s_new
+            a = a_new
+    return n_episodes, c, p
+
+@jit
+def windy_sarsa_kernel(next_state, reward, done, Q, visited, lengths,
+                       rewardsum, start, n_episodes, alfa, epsilon, discount,
+                       u, noise, s, a, e):
+    """SARSA on WindyGridWorld tables [s, a, noise], noise is only used
+    with stochastic wind. It stops when u or noise may be used up and
+    returns (s, a, e) to go on with the next block and the positions in u
+    and noise, a = -1 means the action of s is not chosen yet"""
+    stochastic = next_state.shape[2] > 1
+    p = 0
+    k_pos = 0
+    while e < n_episodes:
+        if a < 0:
+            if p == len(u):
+                return s, a, e, p, k_pos
+            visited[s] = True
+            a = _epsilon_greedy(Q, s, u[p], epsilon)
+            p += 1
+        if p == len(u) or (stochastic and k_pos == len(noise)):
+            return s, a, e, p, k_pos
+
+        k = 0
+        if stochastic:
+            k = noise[k_pos]
+            k_pos += 1
+        s_new = next_state[s, a, k]
+        r = reward[s, a, k]
+        lengths[e] += 1
+        rewardsum[e] += r
+
+        if done[s, a, k]:
+            Q[s, a] += alfa * (r - Q[s, a])
+            s = start
+            a = -1
+            e += 1
+            continue
+
+        visited[s_new] = True
+        a_new = _epsilon_greedy(Q, s_new, u[p], epsilon)
+        p += 1
+        Q[s, a] += alfa * (r + discount * Q[s_new, a_new] - Q[s, a])
+        s = s_new
+        a = a_new
+    return s, a, e, p, k_pos
+
+
+def _policy_table(policy, encoder):
+    """policy function, e.g policy_0(pl, de, ace), to array [s, action]"""
+    return np.array([policy(*state) for state in encoder.states], dtype=float)
+
+def _blackjack_run(kernel, env, seed, n_episodes, block_size, *args):
+    """run a BlackJack kernel on the card stream of env and the uniform
+    stream of seed until n_episodes are done"""
+    if block_size < BLACKJACK_DRAWS:
+        raise ValueError("block_size must be at least {}".format(
+                                                        BLACKJACK_DRAWS))
+    uniform = UniformBuffer(seed)
+    cards = np.zeros(0, dtype=np.int64)
+    u = np.zeros(0)
+    done = 0
+    while done < n_episodes:
+        cards = np.concatenate([cards, env.cards.draw_many(block_size)])
+        u = np.concatenate([u, uniform.draw_many(block_size)])
+        n, c, p = kernel(cards, u, n_episodes - done, *args)
+        done += n
+        cards = cards[c:]
+        u = u[p:]
+
+def blackjack_mc_prediction(env, policy, n_episodes, discount=1.0, seed=None,
+                            compiled=True, block_size=1 << 16):
+    """Monte-carlo prediction of policy on a BlackJack env, the same as
+    BlackJack_MC.mc_prediction (stationary), compiled=False runs the
+    kernel as Python"""
+    encoder = env.encoder()
+    V = np.zeros(BLACKJACK_STATES)
+    counter = np.zeros(BLACKJACK_STATES)
+    kernel = blackjack_mc_kernel if compiled else blackjack_mc_kernel.py_func
+    _blackjack_run(kernel, env, seed, n_episodes, block_size,
+                   _policy_table(policy, encoder), V, counter, discount)
+    return _value_store(encoder, V, counter)
+
+def blackjack_td_prediction(env, policy, n_episodes, alfa=0.05, discount=1.0,
+                            lmbd=0.0, threshold=0.0, seed=None, compiled=True,
+                            block_size=1 << 16):
+    """TD(lambda) prediction of policy on a BlackJack env, the same as
+    BlackJack_TD.td_prediction (lmbd = 0) and
+    BlackJack_TD_lambda.tdlambda_prediction (accumulating trace),
+    compiled=False runs the kernel as Python"""
+    encoder = env.encoder()
+    V = np.zeros(BLACKJACK_STATES)
+    counter = np.zeros(BLACKJACK_STATES)
+    kernel = blackjack_td_kernel if compiled else blackjack_td_kernel.py_func
+    _blackjack_run(kernel, env, seed, n_episodes, block_size,
+                   _policy_table(policy, encoder), V, counter, alfa, discount,
+                   lmbd, threshold)
+    return _value_store(encoder, V, counter)
+
+def blackjack_td_control(env, n_episodes, alfa=1.0, epsilon=0.1, discount=1.0,
+                         seed=None, compiled=True, block_size=1 << 16):
+    """SARSA with the policy_epsilon of BlackJack_TD on a BlackJack env, the
+    same as BlackJack_TD.td_control, compiled=False runs the kernel as
+    Python
+
+    return Q (TabularValueStore)
+    """
+    from lib.tabular import TabularValueStore
+
+    Q = TabularValueStore(env.encoder(), n_actions=env.nAction)
+    kernel = blackjack_sarsa_kernel if compiled else \
+             blackjack_sarsa_kernel.py_func
+    _blackjack_run(kernel, env, seed, n_episodes, block_size, Q.table,
+                   Q.visited, alfa, epsilon, discount)
+    return Q
+
+def windy_td_control(env, n_episodes, alfa=0.5, epsilon=0.1, discount=1.0,
+                     seed=None, compiled=True, block_size=1 << 16):
+    """SARSA on a WindyGridWorld env, the same as WindyGridWorld_TD.td_control,
+    compiled=False runs the kernel as Python
+
+    return Q (TabularValueStore), episode lengths, episode rewards
+    """
+    from lib.tabular import TabularValueStore
+
+    if block_size < 1:
+        raise ValueError("block_size must be at least 1")
+    Q = TabularValueStore(env.encoder(), n_actions=env.nAction)
+    lengths = np.zeros(n_episodes)
+    rewardsum = np.zeros(n_episodes)
+    kernel = windy_sarsa_kernel if compiled else windy_sarsa_kernel.py_func
+    start = env.start[0] * env.shape[1] + env.start[1]
+
+    uniform = UniformBuffer(seed)
+    u = np.zeros(0)
+    noise = np.zeros(0, dtype=np.int64)
+    s, a, e = start, -1, 0
+    while e < n_episodes:
+        u = np.concatenate([u, uniform.draw_many(block_size)])
+        if env.stochastic_wind:
+            noise = np.concatenate([noise, env.noise.draw_many(block_size)])
+        s, a, e, p, k_pos = kernel(env.next_state, env.reward, env.done,
+                                   Q.table, Q.visited, lengths, rewardsum,
+                                   start, n_episodes, alfa, epsilon, discount,
+                                   u, noise, s, a, e)
+        u = u[p:]
+        noise = noise[k_pos:]
+    return Q, lengths, rewardsum
+
+def _value_store(encoder, V, counter):
+    from lib.tabular import TabularValueStore
+
+    store = TabularValueStore(encoder)
+    store.table[:] = V
+    store.visited[:] = counter > 0
+    return store
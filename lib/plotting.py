@@ -1,13 +1,16 @@
-import matplotlib
 import numpy as np
-import pandas as pd
 from collections import namedtuple
-from matplotlib import pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
+
+# matplotlib, pandas and mplot3d are imported only when a plot is made,
+# so importing this module (e.g for EpisodeStats) is cheap and needs no display
 
 EpisodeStats = namedtuple("Stats",["episode_lengths", "episode_rewards"])
 
 def plot_cost_to_go_mountain_car(env, estimator, num_tiles=20):
+    import matplotlib
+    from matplotlib import pyplot as plt
+    from mpl_toolkits.mplot3d import Axes3D
+
     x = np.linspace(env.observation_space.low[0], env.observation_space.high[0], num=num_tiles)
     y = np.linspace(env.observation_space.low[1], env.observation_space.high[1], num=num_tiles)
     X, Y = np.meshgrid(x, y)
@@ -29,6 +32,10 @@ def plot_value_function(V, title="Value Function"):
     """
     Plots the value function as a surface plot.
     """
+    import matplotlib
+    from matplotlib import pyplot as plt
+    from mpl_toolkits.mplot3d import Axes3D
+
     min_x = min(k[0] for k in V.keys())
     max_x = max(k[0] for k in V.keys())
     min_y = min(k[1] for k in V.keys())
@@ -61,6 +68,9 @@ def plot_value_function(V, title="Value Function"):
 
 
 def plot_episode_stats(stats, smoothing_window=10, noshow=False):
+    import pandas as pd
+    from matplotlib import pyplot as plt
+
     # Plot the episode length over time
     fig1 = plt.figure(figsize=(10,5))
     plt.plot(stats.episode_lengths)
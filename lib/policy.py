@@ -0,0 +1,126 @@
+import numpy as np
+
+from lib.buffers import UniformBuffer
+
+
+class GreedyPolicy(object):
+    """Choose the action which has maximum Q value
+
+    sample() = PARAMS : q - Q values of one state [n_actions]
+               RETURN : action
+
+    sample_many() = PARAMS : q - Q values of many states [n, n_actions]
+                    RETURN : array of n actions
+
+    probs() = PARAMS : q - Q values of one state [n_actions]
+              RETURN : probability of choosing every action
+    """
+    def __init__(self, n_actions):
+        self.n_actions = n_actions
+
+    def sample(self, q):
+        return int(q.argmax())
+
+    def sample_many(self, q):
+        return np.argmax(q, axis=1)
+
+    def probs(self, q):
+        A = np.zeros(self.n_actions)
+        A[q.argmax()] = 1
+        return A
+
+
+class EpsilonGreedyPolicy(GreedyPolicy):
+    """Policy-epsilon :
+       - epsilon probability choosing random action
+       - 1-epsilon probability choosing action wich has maximum Q value
+
+    One uniform number u from a pre-sampled buffer decides both: u < epsilon
+    means explore, and then u / epsilon is uniform too so it picks the
+    random action. epsilon can be changed anytime (e.g GLIE schedule),
+    it can be an array [n] for sample_many (one epsilon for every state).
+
+    seed = int, SeedSequence or Generator - seed of the uniform buffer
+    """
+    def __init__(self, epsilon, n_actions, seed=None):
+        super(EpsilonGreedyPolicy, self).__init__(n_actions)
+        self.epsilon = epsilon
+        self.uniform = UniformBuffer(seed)
+
+    def sample(self, q):
+        u = self.uniform.draw()
+        if u < self.epsilon:
+            # Explore
+            return min(int(u / self.epsilon * self.n_actions),
+                       self.n_actions - 1)
+        # Exploit
+        return int(q.argmax())
+
+    def sample_many(self, q):
+        u = self.uniform.draw_many(len(q))
+        epsilon = np.broadcast_to(self.epsilon, u.shape)
+        explore = u < epsilon
+        scaled = np.divide(u, epsilon, out=np.zeros_like(u), where=explore)
+        random_action = (scaled * self.n_actions).astype(np.int64)
+        return np.where(explore, np.minimum(random_action, self.n_actions - 1),
+                        np.argmax(q, axis=1))
+
+    def probs(self, q):
+        A = np.full(self.n_actions, self.epsilon / self.n_actions)
+        A[q.argmax()] += 1 - self.epsilon
+        return A
+
+
+class SoftmaxPolicy(GreedyPolicy):
+    """Choose action a with probability exp(q[a] / temperature) / sum
+
+    The probabilities are computed in a preallocated array and one uniform
+    number from a pre-sampled buffer picks the action.
+
+    seed = int, SeedSequence or Generator - seed of the uniform buffer
+    """
+    def __init__(self, temperature, n_actions, seed=None):
+        super(SoftmaxPolicy, self).__init__(n_actions)
+        self.temperature = temperature
+        self.uniform = UniformBuffer(seed)
+        self._cum = np.zeros(n_actions)
+
+    def sample(self, q):
+        cum = self._cum
+        np.subtract(q, q.max(), out=cum)
+        cum /= self.temperature
+        np.exp(cum, out=cum)
+        np.cumsum(cum, out=cum)
+        action = int(np.searchsorted(cum, self.uniform.draw() * cum[-1],
+                                     side='right'))
+        return min(action, self.n_actions - 1)
+
+    def sample_many(self, q):
+        p = np.exp((q - q.max(axis=1, keepdims=True)) / self.temperature)
+        cum = np.cumsum(p, axis=1)
+        u = self.uniform.draw_many(len(q))[:, None] * cum[:, -1:]
+        action = np.sum(cum <= u, axis=1)
+        return np.minimum(action, self.n_actions - 1)
+
+    def probs(self, q):
+        p = np.exp((q - q.max()) / self.temperature)
+        return p / p.sum()
+
+
+class ProbabilitySampler(object):
+    """Choose an action from the action probabilities of a fixed policy,
+    e.g policy_0(pl_score, de_score, use_ace) which return [stick, hit]
+
+    seed = int, SeedSequence or Generator - seed of the uniform buffer
+    """
+    def __init__(self, seed=None):
+        self.uniform = UniformBuffer(seed)
+
+    def sample(self, p):
+        u = self.uniform.draw()
+        total = 0.0
+        for action, prob in enumerate(p):
+            total += prob
+            if u < total:
+                return action
+        return len(p) - 1
@@ -0,0 +1,206 @@
+import numpy as np
+
+# One transition on disk, fixed width (16 bytes)
+transition_dtype = np.dtype([('state', np.int32), ('action', np.int32),
+                             ('reward', np.float32), ('done', np.bool_)],
+                            align=True)
+
+
+class EpisodeRecorder(object):
+    """Stream transitions (state index, action, reward, done) of many
+    episodes to disk
+
+    Transitions are written into a preallocated record chunk and the chunk
+    is appended to '<path>.dat' when it is full, so memory use does not grow
+    with the number of episodes. The first step of every episode is kept
+    in the index '<path>.idx' (int64, the last item is the number of
+    transitions of the finished episodes), the episode ends of a chunk are
+    appended to it together with the chunk, so after a crash both files
+    hold every episode of the written chunks.
+
+    path = str - file name without extension
+    chunk_size = int - number of transitions written at once
+
+    record() = PARAMS : state index, action, reward, done_status
+               RETURN : None
+
+    It can be used as a context manager, close() is called at the end.
+    """
+    def __init__(self, path, chunk_size=65536):
+        self.path = path
+        self.file = open(path + '.dat', 'wb')
+        self.index = open(path + '.idx', 'wb')
+        self.chunk = np.zeros(chunk_size, dtype=transition_dtype)
+        self.pos = 0
+        self.n_written = 0
+
+        # a chunk has at most chunk_size episode ends
+        self.ends = np.zeros(chunk_size, dtype=np.int64)
+        self.n_ends = 0
+        self.index.write(np.zeros(1, dtype=np.int64).tobytes())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def record(self, state, action, reward, done):
+        self.chunk[self.pos] = (state, action, reward, done)
+        self.pos += 1
+        if done:
+            self.ends[self.n_ends] = self.n_written + self.pos
+            self.n_ends += 1
+        if self.pos == len(self.chunk):
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.chunk[:self.pos].tobytes())
+        self.file.flush()
+        # the index only points to transitions which are on disk
+        self.index.write(self.ends[:self.n_ends].tobytes())
+        self.index.flush()
+        self.n_written += self.pos
+        self.pos = 0
+        self.n_ends = 0
+
+    def close(self):
+        # an unfinished episode is not in the index
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+        self.index.close()
+
+
+class EpisodeReader(object):
+    """Read episodes written by EpisodeRecorder without loading them
+
+    records = memmap of transition_dtype - every transition, read from
+              disk only when it is used
+    offsets = int array [n_episodes + 1] - first step of every episode
+
+    episode() = PARAMS : i - episode number
+                RETURN : records of episode i
+
+    chunks() = PARAMS : max_steps - number of transitions of a chunk
+               RETURN : iterator of (records, offsets) of whole episodes,
+                        offsets are relative to the chunk
+    """
+    def __init__(self, path):
+        self.offsets = np.fromfile(path + '.idx', dtype=np.int64)
+        self.n_episodes = len(self.offsets) - 1
+        if self.offsets[-1] > 0:
+            self.records = np.memmap(path + '.dat', dtype=transition_dtype,
+                                     mode='r', shape=(int(self.offsets[-1]),))
+        else:
+            self.records = np.zeros(0, dtype=transition_dtype)
+
+    def __len__(self):
+        return self.n_episodes
+
+    def episode(self, i):
+        return self.records[self.offsets[i]:self.offsets[i + 1]]
+
+    def chunks(self, max_steps=1 << 20):
+        e = 0
+        while e < self.n_episodes:
+            # take as many whole episodes as fit (at least one)
+            last = np.searchsorted(self.offsets, self.offsets[e] + max_steps,
+                                   side='right') - 1
+            last = max(last, e + 1)
+            start = self.offsets[e]
+            yield (np.asarray(self.records[start:self.offsets[last]]),
+                   self.offsets[e:last + 1] - start)
+            e = last
+
+
+def backward_levels(offsets):
+    """steps of many episodes grouped by how many steps are left to the end
+    of their episode, iterator of index arrays for 1, 2, ... steps left
+    (the last steps are not in it), so a backward pass over all episodes
+    is one array operation per level
+
+    The steps are sorted by steps left once (counting sort), every level
+    is a slice of that order.
+    """
+    togo = np.repeat(offsets[1:] - 1, np.diff(offsets)) - \
+           np.arange(offsets[-1] - offsets[0]) - offsets[0]
+    if len(togo) == 0:
+        return
+    order = np.argsort(togo, kind='stable')
+    ends = np.cumsum(np.bincount(togo))
+    for d in range(1, len(ends)):
+        yield order[ends[d - 1]:ends[d]]
+
+
+def episode_returns(rewards, offsets, discount=1.0):
+    """return G of every step of many episodes,
+    G[t] = rewards[t] + discount * G[t+1] inside an episode
+
+    All steps which are d steps before the end of their episode are done
+    at once (backward_levels), so it loops over the longest episode length
+    only.
+    """
+    G = np.asarray(rewards, dtype=float).copy()
+    for t in backward_levels(offsets):
+        G[t] += discount * G[t + 1]
+    return G
+
+
+def mc_evaluation(reader, n_states, discount=1.0, first_visit=False,
+                  max_steps=1 << 20):
+    """Offline Monte-carlo prediction from recorded episodes, the average
+    return of every state
+
+    first_visit = bool - First-Visit if True, Every-Visit otherwise
+
+    return V, counter - float arrays [n_states]
+    """
+    returnsum = np.zeros(n_states)
+    counter = np.zeros(n_states)
+
+    for records, offsets in reader.chunks(max_steps):
+        states = records['state'].astype(np.int64)
+        G = episode_returns(records['reward'], offsets, discount)
+
+        if first_visit:
+            # keep the first step of every (episode, state)
+            episode = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+            key = episode * n_states + states
+            first = np.unique(key, return_index=True)[1]
+            states, G = states[first], G[first]
+
+        returnsum += np.bincount(states, G, n_states)
+        counter += np.bincount(states, None, n_states)
+
+    V = np.zeros(n_states)
+    np.divide(returnsum, counter, out=V, where=counter > 0)
+    return V, counter
+
+
+def td_evaluation(reader, n_states, alfa=0.1, discount=1.0, n_sweeps=1,
+                  V=None, max_steps=1 << 20):
+    """Offline TD(0) prediction from recorded episodes, every sweep replays
+    all episodes once, the next state of a step is the state of the next
+    record (terminal if done)
+
+    return V - float array [n_states]
+    """
+    V = np.zeros(n_states) if V is None else V
+    values = V.tolist()
+
+    for sweep in range(n_sweeps):
+        for records, offsets in reader.chunks(max_steps):
+            states = records['state'].tolist()
+            rewards = records['reward'].tolist()
+            done = records['done'].tolist()
+
+            for t in range(len(states)):
+                s = states[t]
+                target = rewards[t] if done[t] else \
+                         rewards[t] + discount * values[states[t + 1]]
+                values[s] += alfa * (target - values[s])
+
+    V[:] = values
+    return V
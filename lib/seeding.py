@@ -0,0 +1,32 @@
+import numpy as np
+
+
+def seed_sequence(seed=None):
+    """int, None, SeedSequence or Generator to SeedSequence, a Generator
+    gives the SeedSequence it was made from"""
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if isinstance(seed, np.random.Generator):
+        return seed.bit_generator.seed_seq
+    return np.random.SeedSequence(seed)
+
+
+def spawn(seed, n):
+    """n independent child SeedSequence of seed, e.g one for every parallel
+    worker or one for the environment and one for the policy, the children
+    are always the same for the same seed
+
+    SeedSequence.spawn changes the sequence it is called on (the next call
+    gives other children), so the children are built from its entropy and
+    spawn_key here and seed is never changed.
+    """
+    parent = seed_sequence(seed)
+    return [np.random.SeedSequence(parent.entropy,
+                                   spawn_key=parent.spawn_key + (i,),
+                                   pool_size=parent.pool_size)
+            for i in range(n)]
+
+
+def spawn_generators(seed, n):
+    """n independent numpy Generator of seed"""
+    return [np.random.default_rng(child) for child in spawn(seed, n)]
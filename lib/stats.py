@@ -0,0 +1,66 @@
+import numpy as np
+
+from statistics import NormalDist
+
+
+class WelfordStats(object):
+    """Online mean and variance of n values (e.g one for every state)
+
+    Welford's algorithm updates mean and M2 (sum of squared difference
+    from the mean) with one sample at a time, it does not keep the samples
+    and it is numerically stable. Two WelfordStats can be merged
+    (Chan et al.), so workers can keep their own and add them at the end.
+
+    count = float array [n] - number of samples
+    mean = float array [n] - sample mean
+    M2 = float array [n] - sum of squared difference from the mean
+    """
+
+    def __init__(self, n):
+        self.count = np.zeros(n)
+        self.mean = np.zeros(n)
+        self.M2 = np.zeros(n)
+
+    def update(self, i, x):
+        """add sample x of value i"""
+        self.count[i] += 1
+        delta = x - self.mean[i]
+        self.mean[i] += delta / self.count[i]
+        self.M2[i] += delta * (x - self.mean[i])
+
+    def merge(self, other):
+        """add all samples of other WelfordStats"""
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio = np.where(count > 0, other.count / count, 0.0)
+        self.mean = self.mean + delta * ratio
+        self.M2 = self.M2 + other.M2 + delta ** 2 * self.count * ratio
+        self.count = count
+
+    def variance(self):
+        """sample variance, 0 if there are less than 2 samples"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 1, self.M2 / (self.count - 1), 0.0)
+
+    def std_error(self):
+        """standard error of the mean, inf if there are less than 2 samples"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 1,
+                            np.sqrt(self.variance() / self.count), np.inf)
+
+    def half_width(self, level=0.95):
+        """half width of the normal confidence interval of the mean"""
+        z = NormalDist().inv_cdf(0.5 + level / 2)
+        return z * self.std_error()
+
+    def confidence_interval(self, level=0.95):
+        """lower and upper bound arrays of the confidence interval"""
+        half_width = self.half_width(level)
+        return self.mean - half_width, self.mean + half_width
+
+    def converged(self, mask, target, level=0.95, min_count=30):
+        """True if every value in mask has at least min_count samples
+        and a confidence interval half width below target"""
+        return bool(np.all(self.count[mask] >= min_count) and
+                    np.all(self.half_width(level)[mask] < target))
@@ -0,0 +1,91 @@
+import itertools
+import numpy as np
+
+
+class StateEncoder(object):
+    """Map every state of an environment to one integer index
+
+    A state is a tuple, every item of it takes values from a range
+    (a bool is a range of 0 and 1). The index of every state is computed
+    once when the encoder is created.
+
+    ranges = list - values of every item of the state,
+             e.g [range(32), range(32), [False, True]]
+    index = dict {(s):i} - index of state s
+    states = list - state of every index
+    """
+
+    def __init__(self, ranges):
+        self.ranges = [list(r) for r in ranges]
+        self.low = np.array([r[0] for r in self.ranges])
+        self.shape = tuple(len(r) for r in self.ranges)
+        self.n_states = int(np.prod(self.shape))
+
+        self.states = list(itertools.product(*self.ranges))
+        self.index = {state: i for i, state in enumerate(self.states)}
+
+    def encode(self, state):
+        return self.index[state]
+
+    def decode(self, i):
+        return self.states[i]
+
+    def encode_many(self, states):
+        """tuple of arrays, one array for every item, to array of index"""
+        return np.ravel_multi_index(
+            tuple(np.asarray(x, dtype=np.int64) - low
+                  for x, low in zip(states, self.low)), self.shape)
+
+
+class TabularValueStore(object):
+    """Value table V or Q stored in one contiguous NumPy array
+
+    It can be used like defaultdict(float) (V) or
+    defaultdict(lambda: np.zeros(n_actions)) (Q) for plotting and
+    simulating, Q[state] returns a view of the row. A state becomes a key
+    when it is set (Q[state] = x), reading it does not change anything.
+
+    Learners should not index by state tuples on every step, they encode a
+    state once (i = encoder.index[state]), mark visited[i] and work on
+    table[i] directly.
+
+    encoder = StateEncoder - map state to index
+    table = float64 array [n_states] or [n_states, n_actions]
+    visited = bool array [n_states] - True if the state is a key
+    """
+
+    def __init__(self, encoder, n_actions=None):
+        self.encoder = encoder
+        self.index = encoder.index
+        shape = (encoder.n_states,) if n_actions is None else \
+                (encoder.n_states, n_actions)
+        self.table = np.zeros(shape)
+        self.visited = np.zeros(encoder.n_states, dtype=bool)
+
+    def __getitem__(self, state):
+        return self.table[self.index[state]]
+
+    def __setitem__(self, state, value):
+        i = self.index[state]
+        self.visited[i] = True
+        self.table[i] = value
+
+    def __contains__(self, state):
+        i = self.index.get(state)
+        return i is not None and self.visited[i]
+
+    def __len__(self):
+        return int(np.count_nonzero(self.visited))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return [self.encoder.states[i] for i in np.flatnonzero(self.visited)]
+
+    def items(self):
+        return [(self.encoder.states[i], self.table[i])
+                for i in np.flatnonzero(self.visited)]
+
+    def to_dict(self):
+        return dict(self.items())
@@ -0,0 +1,145 @@
+import numpy as np
+import time
+
+from lib.plotting import EpisodeStats
+from lib.policy import EpsilonGreedyPolicy
+from lib.tabular import TabularValueStore
+
+methods = ('sarsa', 'q_learning', 'expected_sarsa')
+
+
+def td_control(env, n_episodes, method='sarsa', n=1, alfa=0.5, epsilon=0.1,
+               discount=1.0, seed=None, recorder=None, policy=None):
+    """TD control with an epsilon-greedy behaviour policy, it works with any
+    environment which has nAction, reset(), state(), act() and encoder()
+
+    method = str - the value of the last state of an n-step return:
+             'sarsa' - Q[s', a'] of the action taken next
+             'q_learning' - max Q[s'] (only n = 1, n-step Q-learning needs
+                            tree backup or importance sampling)
+             'expected_sarsa' - expected Q[s'] of the epsilon-greedy policy
+    n = int - number of rewards before bootstrapping (n-step TD)
+    seed = int, SeedSequence or Generator - seed of action choosing
+    recorder = lib.replay.EpisodeRecorder - every step is recorded if given
+    policy = function - policy(Q, sampler, state) returns the action of
+             state, e.g policy_epsilon of BlackJack_TD (default
+             sampler.sample of the Q row), sampler is the epsilon-greedy
+             lib.policy.EpsilonGreedyPolicy, not with 'expected_sarsa'
+             (its expectation is the one of the epsilon-greedy policy)
+
+    Q is one array [state index, action]. The last n+1 states, actions and
+    rewards of an episode are kept in preallocated circular buffers, step t
+    is on position t % (n + 1), so nothing grows while an episode runs.
+
+    return Q (TabularValueStore), EpisodeStats (episode_lengths is the
+    number of steps)
+
+    n-step TD refference:
+    [1] Sutton & Barto, Reinforcement Learning: An Introduction (2nd Ed),
+        section 6.4 - 6.6 and 7.2
+    """
+    if method not in methods:
+        raise ValueError("unknown TD method: {}".format(method))
+    if method == 'q_learning' and n > 1:
+        raise ValueError("q_learning only supports n = 1")
+    if method == 'expected_sarsa' and policy is not None:
+        raise ValueError("expected_sarsa only supports the epsilon-greedy "
+                         "policy (policy=None)")
+
+    encoder = env.encoder()
+    index = encoder.index
+    n_actions = env.nAction
+    Q = TabularValueStore(encoder, n_actions=n_actions)
+    table = Q.table
+    sampler = EpsilonGreedyPolicy(epsilon, n_actions, seed)
+
+    stats = EpisodeStats(episode_lengths=np.zeros(n_episodes),
+                         episode_rewards=np.zeros(n_episodes))
+
+    # Circular buffers of the last n+1 steps
+    size = n + 1
+    states = [0] * size
+    actions = [0] * size
+    rewards = [0.0] * size
+    powers = [discount ** i for i in range(n + 1)]
+
+    def bootstrap(s, a):
+        if method == 'sarsa':
+            return table[s, a]
+        if method == 'q_learning':
+            return table[s].max()
+        q = table[s]
+        return (1 - epsilon) * q.max() + epsilon * q.mean()
+
+    def choose(s, state):
+        if policy is None:
+            return sampler.sample(table[s])
+        return policy(Q, sampler, state)
+
+    for e in range(n_episodes):
+        env.reset()
+        state = env.state()
+        s = index[state]
+        states[0] = s
+        Q.visited[s] = True
+        actions[0] = choose(s, state)
+
+        T = None
+        t = 0
+        while True:
+            if T is None:
+                # Take action
+                now = t % size
+                next_state, done, reward = env.act(actions[now])
+                if recorder is not None:
+                    recorder.record(states[now], actions[now], reward, done)
+
+                nxt = (t + 1) % size
+                rewards[nxt] = reward
+                stats.episode_rewards[e] += reward
+
+                if done:
+                    T = t + 1
+                else:
+                    s = index[next_state]
+                    Q.visited[s] = True
+                    states[nxt] = s
+                    actions[nxt] = choose(s, next_state)
+
+            # Update the step which has n rewards now (or the episode ends)
+            tau = t - n + 1
+            if tau >= 0:
+                end = tau + n if T is None else min(tau + n, T)
+                G = 0.0
+                for i in range(tau + 1, end + 1):
+                    G += powers[i - tau - 1] * rewards[i % size]
+                if T is None or tau + n < T:
+                    G += powers[n] * bootstrap(states[end % size],
+                                               actions[end % size])
+
+                p = tau % size
+                s_tau, a_tau = states[p], actions[p]
+                table[s_tau, a_tau] += alfa * (G - table[s_tau, a_tau])
+
+            if T is not None and tau >= T - 1:
+                break
+            t += 1
+
+        stats.episode_lengths[e] = T
+
+    return Q, stats
+
+
+def benchmark(env, n_episodes=1000, ns=(1, 4), seed=0, **kwargs):
+    """steps per second of every TD method and n on env"""
+    for method in methods:
+        for n in ns:
+            if method == 'q_learning' and n > 1:
+                continue
+            start = time.time()
+            Q, stats = td_control(env, n_episodes, method, n, seed=seed,
+                                  **kwargs)
+            elapsed = time.time() - start
+            steps = stats.episode_lengths.sum()
+            print("{:<15} n={:<3} steps: {:>8} | steps/sec: {:>10.0f}".format(
+                        method, n, int(steps), steps / elapsed))
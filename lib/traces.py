@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class EligibilityTraces(object):
+    """Eligibility traces of the states (or state-action pairs) of an episode
+
+    Only states which have a trace are kept, every state is kept once in
+    idx/z no matter how many times it is visited, so one TD update is one
+    array operation over the active states. A trace which decays below
+    threshold is dropped.
+
+    n = int - number of states (index goes from 0 to n-1)
+    kind = str - 'accumulating', 'replacing' or 'dutch'
+    threshold = float - trace smaller than this is dropped
+    idx = int array - index of active states, only the first size items
+    z = float array - trace of active states, only the first size items
+    pos = int array [n] - position of a state in idx/z, -1 if not active
+
+    Eligibility traces refference:
+    [1] Sutton & Barto, Reinforcement Learning: An Introduction (2nd Ed),
+        chapter 12
+    """
+
+    def __init__(self, n, kind='accumulating', threshold=1e-4, capacity=64):
+        if kind not in ('accumulating', 'replacing', 'dutch'):
+            raise ValueError("unknown trace kind: {}".format(kind))
+
+        self.kind = kind
+        self.threshold = threshold
+        self.pos = np.full(n, -1, dtype=np.int64)
+        self.idx = np.zeros(capacity, dtype=np.int64)
+        self.z = np.zeros(capacity)
+        self.size = 0
+
+    def reset(self):
+        self.pos[self.idx[:self.size]] = -1
+        self.size = 0
+
+    def visit(self, i, alfa=1.0):
+        """increase the trace of state i, alfa is only used by dutch trace"""
+        p = self.pos[i]
+        if p < 0:
+            if self.size == len(self.idx):
+                self.idx = np.concatenate([self.idx, np.zeros_like(self.idx)])
+                self.z = np.concatenate([self.z, np.zeros_like(self.z)])
+            p = self.size
+            self.idx[p] = i
+            self.z[p] = 0.0
+            self.pos[i] = p
+            self.size += 1
+
+        if self.kind == 'accumulating':
+            self.z[p] += 1
+        elif self.kind == 'replacing':
+            self.z[p] = 1
+        else:
+            self.z[p] = (1 - alfa) * self.z[p] + 1
+
+    def update(self, table, step, decay):
+        """table[s] += step * z[s] for every active state s,
+        then every trace is multiplied by decay (discount * lambda)
+
+        table = float array [n] - the value table, changed in place
+        """
+        n = self.size
+        idx = self.idx[:n]
+        z = self.z[:n]
+
+        table[idx] += step * z
+        z *= decay
+
+        keep = z >= self.threshold
+        if not keep.all():
+            self.pos[idx[~keep]] = -1
+            k = np.count_nonzero(keep)
+            self.idx[:k] = idx[keep]
+            self.z[:k] = z[keep]
+            self.pos[self.idx[:k]] = np.arange(k)
+            self.size = k
+
+    def active(self):
+        """index and trace of active states"""
+        return self.idx[:self.size], self.z[:self.size]
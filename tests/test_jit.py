@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+import BlackJack_MC
+import BlackJack_TD
+import BlackJack_TD_lambda
+import WindyGridWorld_TD
+from BlackJack_env import BlackJack
+from WindyGridWorld import WindyGridWorld
+from lib import jit
+
+# the kernel run as Python always, compiled only when Numba is installed
+compiled = [False, pytest.param(True, marks=pytest.mark.skipif(
+    not jit.HAVE_NUMBA, reason="numba is not installed"))]
+
+n_episodes = 2000
+block_size = jit.BLACKJACK_DRAWS  # many blocks, the rest of a block is kept
+
+
+@pytest.mark.parametrize("compiled", compiled)
+def test_blackjack_mc_prediction(compiled):
+    V = BlackJack_MC.mc_prediction(BlackJack_MC.policy_0, n_episodes,
+                                   env=BlackJack(seed=1), seed=2,
+                                   backend='python')
+    kernel_V = jit.blackjack_mc_prediction(
+        BlackJack(seed=1), BlackJack_MC.policy_0, n_episodes, seed=2,
+        compiled=compiled, block_size=block_size)
+    np.testing.assert_array_equal(V.table, kernel_V.table)
+    np.testing.assert_array_equal(V.visited, kernel_V.visited)
+
+
+@pytest.mark.parametrize("compiled", compiled)
+def test_blackjack_td_prediction(compiled):
+    V = BlackJack_TD.td_prediction(BlackJack_TD.policy_0, n_episodes,
+                                   alfa=0.05, env=BlackJack(seed=1), seed=2,
+                                   backend='python')
+    kernel_V = jit.blackjack_td_prediction(
+        BlackJack(seed=1), BlackJack_TD.policy_0, n_episodes, alfa=0.05,
+        seed=2, compiled=compiled, block_size=block_size)
+    np.testing.assert_array_equal(V.table, kernel_V.table)
+
+
+@pytest.mark.parametrize("compiled", compiled)
+def test_blackjack_tdlambda_prediction(compiled):
+    V = BlackJack_TD_lambda.tdlambda_prediction(
+        BlackJack_TD_lambda.policy_0, n_episodes, alfa=0.05, lmbd=0.3,
+        env=BlackJack(seed=1), seed=2, backend='python')
+    kernel_V = jit.blackjack_td_prediction(
+        BlackJack(seed=1), BlackJack_TD_lambda.policy_0, n_episodes,
+        alfa=0.05, lmbd=0.3, threshold=1e-4, seed=2, compiled=compiled,
+        block_size=block_size)
+    np.testing.assert_array_equal(V.table, kernel_V.table)
+
+
+@pytest.mark.parametrize("compiled", compiled)
+def test_blackjack_td_control(compiled):
+    Q, policy = BlackJack_TD.td_control(
+        BlackJack_TD.policy_epsilon, n_episodes, alfa=0.05,
+        env=BlackJack(seed=1), seed=2, backend='python')
+    kernel_Q = jit.blackjack_td_control(
+        BlackJack(seed=1), n_episodes, alfa=0.05, seed=2, compiled=compiled,
+        block_size=block_size)
+    np.testing.assert_array_equal(Q.table, kernel_Q.table)
+    np.testing.assert_array_equal(Q.visited, kernel_Q.visited)
+
+
+@pytest.mark.parametrize("compiled", compiled)
+@pytest.mark.parametrize("stochastic_wind", [False, True])
+def test_windy_td_control(compiled, stochastic_wind):
+    Q, stats = WindyGridWorld_TD.td_control(
+        WindyGridWorld_TD.policy_epsilon, 50,
+        env=WindyGridWorld(stochastic_wind=stochastic_wind, seed=1), seed=2,
+        backend='python')
+    kernel_Q, lengths, rewards = jit.windy_td_control(
+        WindyGridWorld(stochastic_wind=stochastic_wind, seed=1), 50, seed=2,
+        compiled=compiled, block_size=100)
+    np.testing.assert_array_equal(Q.table, kernel_Q.table)
+    np.testing.assert_array_equal(Q.visited, kernel_Q.visited)
+    np.testing.assert_array_equal(stats.episode_lengths, lengths)
+    np.testing.assert_array_equal(stats.episode_rewards, rewards)
+
+
+def test_block_size():
+    with pytest.raises(ValueError):
+        jit.blackjack_mc_prediction(BlackJack(), BlackJack_MC.policy_0, 1,
+                                    block_size=jit.BLACKJACK_DRAWS - 1)
+    with pytest.raises(ValueError):
+        jit.windy_td_control(WindyGridWorld(), 1, block_size=0)